@@ -0,0 +1,75 @@
+"""
+Cold import time of the modules DSS loads for each UI interaction.
+
+Every dataset settings dropdown runs resource/browse_xmla.py in a fresh
+Python process, so its import cost is paid on each of them. Each module is
+imported in its own interpreter, several times, and the median is reported
+along with the modules that should only be loaded by the code paths using
+them (DEFERRED_MODULES).
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --max-ms 400
+
+The command exits with an error when a deferred module is loaded at import
+time, or when a median goes over --max-ms.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+PATHS = [
+    os.path.join(BENCHMARKS_DIRECTORY, "..", "python-lib"),
+    os.path.join(BENCHMARKS_DIRECTORY, "..", "resource")
+]
+
+MODULES = ["browse_xmla", "xmla_client"]
+
+DEFERRED_MODULES = ["asyncio", "xmltodict", "xmla_stream", "concurrent.futures"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+sys.path[:0] = {paths}
+start = time.time()
+import {module}
+elapsed = time.time() - start
+print(json.dumps({{"elapsed": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def measure(module):
+    script = IMPORT_SCRIPT.format(paths=json.dumps(PATHS), module=module)
+    output = subprocess.check_output([sys.executable, "-c", script])
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail when a median import time goes over this")
+    args = parser.parse_args()
+
+    failures = []
+    print("{:<14} {:>12} {:>12} {:>9}  {}".format("module", "median (ms)", "min (ms)", "modules", "deferred modules loaded"))
+    for module in MODULES:
+        results = [measure(module) for _ in range(args.runs)]
+        timings = sorted(result["elapsed"] * 1000 for result in results)
+        median = timings[len(timings) // 2]
+        loaded_modules = results[-1]["modules"]
+        deferred_loaded = [name for name in DEFERRED_MODULES if name in loaded_modules]
+        print("{:<14} {:>12.1f} {:>12.1f} {:>9}  {}".format(
+            module, median, timings[0], len(loaded_modules), ", ".join(deferred_loaded) or "-"
+        ))
+        if deferred_loaded:
+            failures.append("{} loads {}".format(module, ", ".join(deferred_loaded)))
+        if args.max_ms is not None and median > args.max_ms:
+            failures.append("{} takes {:.1f} ms to import".format(module, median))
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Local stand-in for an XMLA server, for benchmarks.
+
+Answers Execute requests with synthetic Multidimensional or Tabular
+responses (following the <Format> property of the request) and Discover
+requests with a small MDSCHEMA_MEASURES rowset. The body is generated and
+written on the fly, so large responses do not need to fit in memory.
+
+    server = MockXMLAServer(Scenario(flavour="mondrian", number_of_rows=100000))
+    server.start()
+    ... XMLAClient(server.endpoint, version="mondrian") ...
+    server.stop()
+"""
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+FLAVOURS = {
+    # envelope prefix, ExecuteResponse tag, hierarchy naming
+    "mondrian": {
+        "envelope": "SOAP-ENV",
+        "response": '<cxmla:{0}Response xmlns:cxmla="urn:schemas-microsoft-com:xml-analysis"><cxmla:return>',
+        "response_end": "</cxmla:return></cxmla:{0}Response>",
+        "hierarchy": "{}"
+    },
+    "sap-bw": {
+        "envelope": "SOAP-ENV",
+        "response": '<{0}Response xmlns="urn:schemas-microsoft-com:xml-analysis"><return>',
+        "response_end": "</return></{0}Response>",
+        "hierarchy": "[{}]"
+    },
+    "power-bi": {
+        "envelope": "soap",
+        "response": '<{0}Response xmlns="urn:schemas-microsoft-com:xml-analysis"><return>',
+        "response_end": "</return></{0}Response>",
+        "hierarchy": "[{0}].[{0}]"
+    }
+}
+
+CHUNK_SIZE = 1000
+
+
+class Scenario(object):
+    def __init__(self, flavour="mondrian", number_of_rows=10000, number_of_dimensions=3,
+                 number_of_measures=3, cardinality=100, sparsity=0.0, seed=0):
+        self.flavour = flavour
+        self.number_of_rows = number_of_rows
+        self.number_of_dimensions = number_of_dimensions
+        self.number_of_measures = number_of_measures
+        self.cardinality = cardinality
+        self.sparsity = sparsity
+        self.seed = seed
+
+    def get_dimensions(self):
+        return ["Dimension{}".format(index) for index in range(self.number_of_dimensions)]
+
+    def get_measures(self):
+        return ["Measure {}".format(index) for index in range(self.number_of_measures)]
+
+    def get_member(self, row_index, dimension_index):
+        # deterministic members, roughly `cardinality` distinct values per hierarchy
+        return (row_index * (dimension_index + 1) * 7919) % self.cardinality
+
+
+def iter_envelope(scenario, method, body_chunks):
+    flavour = FLAVOURS[scenario.flavour]
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n<{0}:Envelope xmlns:{0}="http://schemas.xmlsoap.org/soap/envelope/"><{0}:Body>'.format(flavour["envelope"])
+    yield flavour["response"].format(method)
+    for chunk in body_chunks:
+        yield chunk
+    yield flavour["response_end"].format(method)
+    yield "</{0}:Body></{0}:Envelope>".format(flavour["envelope"])
+
+
+def iter_multidimensional(scenario):
+    flavour = FLAVOURS[scenario.flavour]
+    random_generator = random.Random(scenario.seed)
+    dimensions = scenario.get_dimensions()
+    measures = scenario.get_measures()
+    yield '<root xmlns="urn:schemas-microsoft-com:xml-analysis:mddataset" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema"><Axes><Axis name="Axis0"><Tuples>'
+    for measure in measures:
+        yield '<Tuple><Member Hierarchy="Measures"><UName>[Measures].[{0}]</UName><Caption>{0}</Caption><LName>[Measures].[MeasuresLevel]</LName><LNum>0</LNum><DisplayInfo>0</DisplayInfo></Member></Tuple>'.format(measure)
+    yield '</Tuples></Axis><Axis name="Axis1"><Tuples>'
+    chunk = []
+    for row_index in range(scenario.number_of_rows):
+        members = []
+        for dimension_index, dimension in enumerate(dimensions):
+            member = scenario.get_member(row_index, dimension_index)
+            members.append('<Member Hierarchy="{0}"><UName>[{1}].[{2}]</UName><Caption>{1} {2}</Caption><LName>[{1}].[Level]</LName><LNum>1</LNum><DisplayInfo>0</DisplayInfo></Member>'.format(
+                flavour["hierarchy"].format(dimension), dimension, member
+            ))
+        chunk.append("<Tuple>{}</Tuple>".format("".join(members)))
+        if len(chunk) >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk)
+    yield '</Tuples></Axis><Axis name="SlicerAxis"><Tuples><Tuple/></Tuples></Axis></Axes><CellData>'
+    chunk = []
+    for cell_ordinal in range(scenario.number_of_rows * len(measures)):
+        if scenario.sparsity and random_generator.random() < scenario.sparsity:
+            continue
+        chunk.append('<Cell CellOrdinal="{0}"><Value xsi:type="xsd:double">{1}</Value><FmtValue>{1}</FmtValue></Cell>'.format(
+            cell_ordinal, cell_ordinal * 1.5
+        ))
+        if len(chunk) >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk)
+    yield "</CellData></root>"
+
+
+def encode_column_name(name):
+    return re.sub(r"[^0-9A-Za-z.]", lambda match: "_x{:04X}_".format(ord(match.group(0))), name)
+
+
+def iter_tabular(scenario):
+    random_generator = random.Random(scenario.seed)
+    dimensions = scenario.get_dimensions()
+    measures = scenario.get_measures()
+    dimension_columns = [encode_column_name("[{0}].[Level].[MEMBER_CAPTION]".format(dimension)) for dimension in dimensions]
+    measure_columns = [encode_column_name("[Measures].[{}]".format(measure)) for measure in measures]
+    yield '<root xmlns="urn:schemas-microsoft-com:xml-analysis:rowset" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xmlns:xsd="http://www.w3.org/2001/XMLSchema">'
+    yield '<xsd:schema targetNamespace="urn:schemas-microsoft-com:xml-analysis:rowset"><xsd:complexType name="row"><xsd:sequence>'
+    for column in dimension_columns:
+        yield '<xsd:element minOccurs="0" name="{}" type="xsd:string"/>'.format(column)
+    for column in measure_columns:
+        yield '<xsd:element minOccurs="0" name="{}" type="xsd:double"/>'.format(column)
+    yield "</xsd:sequence></xsd:complexType></xsd:schema>"
+    chunk = []
+    cell_ordinal = 0
+    for row_index in range(scenario.number_of_rows):
+        values = []
+        for dimension_index, column in enumerate(dimension_columns):
+            values.append("<{0}>{1} {2}</{0}>".format(column, dimensions[dimension_index], scenario.get_member(row_index, dimension_index)))
+        for column in measure_columns:
+            if not (scenario.sparsity and random_generator.random() < scenario.sparsity):
+                values.append("<{0}>{1}</{0}>".format(column, cell_ordinal * 1.5))
+            cell_ordinal += 1
+        chunk.append("<row>{}</row>".format("".join(values)))
+        if len(chunk) >= CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+    yield "".join(chunk)
+    yield "</root>"
+
+
+def iter_discover(scenario):
+    yield '<root xmlns="urn:schemas-microsoft-com:xml-analysis:rowset">'
+    for measure in scenario.get_measures():
+        yield "<row><CATALOG_NAME>Benchmark</CATALOG_NAME><CUBE_NAME>Benchmark</CUBE_NAME><MEASURE_NAME>{0}</MEASURE_NAME><MEASURE_UNIQUE_NAME>[Measures].[{0}]</MEASURE_UNIQUE_NAME><DATA_TYPE>5</DATA_TYPE></row>".format(measure)
+    yield "</root>"
+
+
+class MockXMLAHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        request = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        scenario = self.server.scenario
+        if "<Discover>" in request:
+            chunks = iter_envelope(scenario, "Discover", iter_discover(scenario))
+        elif "<Format>Tabular</Format>" in request:
+            chunks = iter_envelope(scenario, "Execute", iter_tabular(scenario))
+        else:
+            chunks = iter_envelope(scenario, "Execute", iter_multidimensional(scenario))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.end_headers()
+        for chunk in chunks:
+            self.wfile.write(chunk.encode("utf-8"))
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class MockXMLAServer(object):
+    def __init__(self, scenario=None, port=0):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), MockXMLAHandler)
+        self.httpd.scenario = scenario or Scenario()
+        self.thread = None
+
+    @property
+    def endpoint(self):
+        return "http://127.0.0.1:{}/xmla".format(self.httpd.server_address[1])
+
+    def set_scenario(self, scenario):
+        self.httpd.scenario = scenario
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,119 @@
+"""
+Throughput benchmarks of the XMLA read path against a local mock server.
+
+Each scenario runs in its own process so that its peak RSS is measured in
+isolation. Reported numbers:
+    rows/s          decoded rows per second, end to end (HTTP + parsing + row assembly)
+    first row (s)   time from the Execute request to the first decoded row
+    peak RSS (MB)   maximum resident memory of the process running the scenario
+
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --rows 1000000 --flavours mondrian power-bi --formats Tabular
+
+The "buffered" mode reads the whole response with XMLAClient.execute and Cube,
+the "stream" mode is what XMLAConnector.generate_rows iterates on.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIRECTORY, "..", "python-lib"))
+sys.path.insert(0, BENCHMARKS_DIRECTORY)
+
+from mock_xmla_server import MockXMLAServer, Scenario  # noqa: E402
+from xmla_client import XMLAClient  # noqa: E402
+from xmla_constants import XMLAConstants  # noqa: E402
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+MDX_QUERY = "SELECT NON EMPTY {[Measures].Members} ON COLUMNS, NON EMPTY {[Dimension0].Children} ON ROWS FROM [Benchmark]"
+
+
+def get_peak_rss_mb():
+    if resource is None:
+        return float("nan")
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak_rss / (1024.0 * 1024.0) if sys.platform == "darwin" else peak_rss / 1024.0
+
+
+def run_scenario(endpoint, flavour, execute_format, mode, results):
+    client = XMLAClient(endpoint, version=flavour, execute_format=execute_format)
+    start = time.time()
+    first_row_time = None
+    number_of_rows = 0
+    if mode == "stream":
+        rows = client.execute_stream(MDX_QUERY).iter_rows()
+    else:
+        rows = client.execute(MDX_QUERY).iter_rows()
+    for _ in rows:
+        if first_row_time is None:
+            first_row_time = time.time() - start
+        number_of_rows += 1
+    elapsed = time.time() - start
+    results.put((number_of_rows, elapsed, first_row_time or elapsed, get_peak_rss_mb()))
+
+
+def measure(server, scenario, execute_format, mode):
+    server.set_scenario(scenario)
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=run_scenario,
+        args=(server.endpoint, scenario.flavour, execute_format, mode, results)
+    )
+    process.start()
+    result = results.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=3)
+    parser.add_argument("--measures", type=int, default=3)
+    parser.add_argument("--cardinality", type=int, default=100)
+    parser.add_argument("--sparsity", type=float, nargs="+", default=[0.0, 0.8])
+    parser.add_argument("--flavours", nargs="+", default=[XMLAConstants.MONDRIAN, XMLAConstants.SAP_BW, XMLAConstants.POWER_BI])
+    parser.add_argument("--formats", nargs="+", default=[XMLAConstants.MULTIDIMENSIONAL, XMLAConstants.TABULAR])
+    parser.add_argument("--buffered", action="store_true", help="also run the buffered Cube path (sap-bw Multidimensional only)")
+    args = parser.parse_args()
+
+    server = MockXMLAServer().start()
+    print("{:<10} {:<17} {:<9} {:>8} {:>10} {:>12} {:>14} {:>13}".format(
+        "flavour", "format", "mode", "sparsity", "rows", "rows/s", "first row (s)", "peak RSS (MB)"
+    ))
+    try:
+        for flavour in args.flavours:
+            for execute_format in args.formats:
+                modes = ["stream"]
+                if args.buffered and flavour == XMLAConstants.SAP_BW and execute_format == XMLAConstants.MULTIDIMENSIONAL:
+                    modes.append("buffered")
+                for mode in modes:
+                    for sparsity in args.sparsity:
+                        scenario = Scenario(
+                            flavour=flavour,
+                            number_of_rows=args.rows,
+                            number_of_dimensions=args.dimensions,
+                            number_of_measures=args.measures,
+                            cardinality=args.cardinality,
+                            sparsity=sparsity
+                        )
+                        number_of_rows, elapsed, first_row_time, peak_rss = measure(server, scenario, execute_format, mode)
+                        print("{:<10} {:<17} {:<9} {:>8.2f} {:>10} {:>12.0f} {:>14.3f} {:>13.1f}".format(
+                            flavour, execute_format, mode, sparsity, number_of_rows,
+                            number_of_rows / elapsed if elapsed else 0, first_row_time, peak_rss
+                        ))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,14 @@
+import os
+import tempfile
 from dataiku.connector import Connector
-from xmla_common import extract_path, RecordsLimit, get_credentials
-from xmla_client import XMLAClient, extract_members
+from xmla_common import RecordsLimit, get_credentials, get_auth_type, get_batch_targets, get_partition_dimension_name, get_hashed_key, get_level_dimension, get_name_parts
+from xmla_client import XMLAClient
+from xmla_async import AsyncXMLAClient, run_coroutine
+from xmla_split import AdaptiveExecution
+from xmla_types import get_dss_type_from_oledb
+from xmla_cache import ResultCache
+from xmla_state import WatermarkStore, IncrementalRead, get_incremental_dimension_sets
+from xmla_metrics import XMLAMetrics
 from xmla_constants import XMLAConstants
 from safe_logger import SafeLogger
 
@@ -18,80 +26,257 @@ class XMLAConnector(Connector):
         ))
         self.dimensions = config.get("select_dimensions", [])
         self.measures = config.get("select_measures", [])
+        self.catalog = config.get("select_catalog")
         self.cube = config.get("select_schema_cube")
         self.properties = config.get("select_properties", [])
-        endpoint, mdx_version, username, password, bearer_token = get_credentials(config)
-        self.client = XMLAClient(
+        self.partitioning_level = config.get("select_partitioning_level")
+        self.incremental_level = config.get("select_incremental_level")
+        self.parallel_slices = config.get("parallel_slices", 1) or 1
+        self.slice_size = config.get("slice_size", 10000) or 10000
+        self.execute_format = config.get("execute_format", XMLAConstants.MULTIDIMENSIONAL)
+        self.split_on_limit = config.get("split_on_limit", True)
+        self.batch_targets = get_batch_targets(config)
+        self.batch_concurrency = config.get("batch_concurrency") or XMLAConstants.DEFAULT_BATCH_CONCURRENCY
+        self.source_column = config.get("batch_source_column") or XMLAConstants.BATCH_SOURCE_COLUMN
+        if self.batch_targets and self.incremental_level:
+            raise Exception("Incremental reads are not available with batch targets")
+        if self.incremental_level and not config.get("incremental_state_directory"):
+            # a temporary directory can be cleared, which would silently reload everything
+            raise Exception("Incremental reads need an incremental state directory")
+        self.metrics = XMLAMetrics(progress_interval=config.get("progress_log_interval", 0) or 0)
+        self.client = self.get_new_client()
+        self.result_cache = None
+        if config.get("use_result_cache", False):
+            self.result_cache = ResultCache(
+                config.get("result_cache_directory") or os.path.join(
+                    tempfile.gettempdir(), "{}-{}".format(XMLAConstants.RESULT_CACHE_DIRECTORY_NAME, os.getuid())
+                ),
+                ttl=60 * (config.get("result_cache_ttl") or 60),
+                max_size=1024 * 1024 * (config.get("result_cache_max_size") or 1024)
+            )
+        self.watermark_store = None
+        if self.incremental_level:
+            self.watermark_store = WatermarkStore(config.get("incremental_state_directory"))
+
+    def get_new_client(self, pooled=True):
+        endpoint, mdx_version, username, password, bearer_token = get_credentials(self.config)
+        return XMLAClient(
             endpoint,
             version=mdx_version,
             username=username,
-            password=password, 
-            bearer_token=bearer_token
+            password=password,
+            bearer_token=bearer_token,
+            execute_format=self.execute_format,
+            metrics=self.metrics,
+            connect_timeout=self.config.get("connect_timeout"),
+            read_timeout=self.config.get("read_timeout"),
+            max_retries=self.config.get("max_retries"),
+            auth_type=get_auth_type(self.config),
+            pooled=pooled,
+            catalog=self.catalog,
+            properties=self.properties
         )
 
     def get_read_schema(self):
         """
         Returns the schema that this connector generates when returning rows.
 
-        The returned schema may be None if the schema is not known in advance.
-        In that case, the dataset schema will be infered from the first rows.
+        Column names are read from the header of a one row slice of the query,
+        sent without NON EMPTY on COLUMNS so that measures empty in that row are kept,
+        dimension columns are strings and measure types come from the
+        DATA_TYPE of MDSCHEMA_MEASURES (or from the rowset schema in Tabular format),
+        discovered while the slice is executed, each on its own client.
+        With batch targets, the first target gives the schema. When the query
+        returns no row, dimension columns are named after the selected dimensions.
+        """
+        catalog, cube_name = self.batch_targets[0] if self.batch_targets else (self.catalog, self.cube)
+        mdx_query = self.build_query(
+            {"dimension_sets": self.get_incremental_dimension_sets(None)}, cube=cube_name, limit=1,
+            non_empty_columns=False
+        )
+        logger.info("Reading schema with mdx_query={}".format(mdx_query))
+        if self.execute_format == XMLAConstants.TABULAR:
+            columns = self.read_header(self.client, mdx_query, catalog)
+            schema_columns = [{"name": name, "type": column_type} for name, column_type in columns]
+        else:
+            # the header and the measure types are independent round trips, sent at once
+            async_client = AsyncXMLAClient(lambda: self.get_new_client(pooled=False), max_concurrency=2)
+            try:
+                (left_columns_names, columns), measures = run_coroutine(async_client.gather(
+                    async_client.run(self.read_header, mdx_query, catalog),
+                    async_client.discover(
+                        "MDSCHEMA_MEASURES",
+                        restrictions={"CATALOG_NAME": catalog, "CUBE_NAME": cube_name}
+                    )
+                ))
+            finally:
+                async_client.close()
+            if not left_columns_names:
+                left_columns_names = self.get_default_left_columns_names()
+                logger.warning("The schema query returned no row, dimension columns are named after the selection: {}".format(
+                    left_columns_names
+                ))
+            measures_types = self.get_measures_types(measures)
+            schema_columns = [{"name": name, "type": "string"} for name in left_columns_names]
+            for name, unique_name in columns:
+                schema_columns.append({"name": name, "type": measures_types.get(unique_name, "string")})
+        if self.batch_targets:
+            schema_columns.append({"name": self.source_column, "type": "string"})
+        return {"columns": schema_columns}
+
+    def get_default_left_columns_names(self):
+        """
+        Dimension and property columns when no row tuple gives the hierarchies:
+        the ROWS hierarchies are the selected dimensions, then the incremental one.
+        """
+        dimensions = list(self.dimensions)
+        if self.incremental_level and get_level_dimension(self.incremental_level) not in dimensions:
+            dimensions.append(get_level_dimension(self.incremental_level))
+        # "[Store]" -> "Store", as in the Hierarchy attribute of the members
+        return [".".join(get_name_parts(dimension)) for dimension in dimensions] + list(self.properties)
 
-        If you do provide a schema here, all columns defined in the schema
-        will always be present in the output (with None value),
-        even if you don't provide a value in generate_rows
+    def read_header(self, client, mdx_query, catalog):
+        return client.execute_stream(mdx_query, catalog=catalog).read_header()
 
-        The schema must be a dict, with a single key: "columns", containing an array of
-        {'name':name, 'type' : type}.
+    def get_measures_types(self, measures):
+        measures_types = {}
+        for measure in measures:
+            measures_types[measure.get("MEASURE_UNIQUE_NAME")] = get_dss_type_from_oledb(measure.get("DATA_TYPE"))
+        return measures_types
 
-        Example:
-            return {"columns" : [ {"name": "col1", "type" : "string"}, {"name" :"col2", "type" : "float"}]}
+    def generate_rows(self, dataset_schema=None, dataset_partitioning=None,
+                      partition_id=None, records_limit=-1):
+        self.metrics.start()
+        try:
+            query_options = {"slicer": self.get_partition_slicer(partition_id)}
+            incremental_read = None
+            if self.incremental_level:
+                incremental_read = self.get_incremental_read(partition_id)
+                logger.info("Incremental read on {} after watermark {}".format(
+                    self.incremental_level, incremental_read.watermark
+                ))
+                # only reads of all the rows move the watermark, so only they are bounded
+                if records_limit < 0 and not self.fix_incremental_bound(incremental_read, query_options):
+                    logger.info("No new members of {}".format(self.incremental_level))
+                    return
+                query_options["dimension_sets"] = incremental_read.get_dimension_sets()
+            limit = RecordsLimit(records_limit=records_limit)
+            for row in self.iter_cached_rows(query_options, records_limit=records_limit):
+                # checked before the yield, so that no more than records_limit rows are returned
+                if limit.is_reached():
+                    return
+                yield row
+                self.metrics.row_emitted()
+            if incremental_read and records_limit < 0:
+                logger.info("New watermark for {}: {}".format(self.incremental_level, incremental_read.bound))
+                incremental_read.commit()
+        finally:
+            if self.result_cache:
+                logger.info("Result cache stats: {}".format(self.result_cache.get_stats()))
+            self.metrics.log_summary()
 
-        Supported types are: string, int, bigint, float, double, date, boolean
+    def build_query(self, query_options, cube=None, **kwargs):
         """
+        query_options holds the per read parts of the query (slicer, dimension_sets),
+        kwargs the per request ones (limit, subset).
+        """
+        kwargs.update(query_options)
+        return self.client.build_mdx_query(cube or self.cube, self.dimensions, self.measures, self.properties, **kwargs)
 
-        # In this example, we don't specify a schema here, so DSS will infer the schema
-        # from the columns actually returned by the generate_rows method
-        return None
+    def iter_cached_rows(self, query_options, records_limit=-1):
+        if not self.result_cache:
+            return self.iter_rows(query_options, records_limit=records_limit)
+        cache_key = self.get_result_cache_key(query_options, records_limit)
+        rows = self.result_cache.get(cache_key)
+        if rows is not None:
+            logger.info("Reading rows from the result cache")
+            return rows
+        return self.result_cache.iter_and_store(cache_key, self.iter_rows(query_options, records_limit=records_limit))
 
-    def generate_rows(self, dataset_schema=None, dataset_partitioning=None,
-                      partition_id=None, records_limit=-1):
-        mdx_query = self.client.build_mdx_query(self.cube, self.dimensions, self.measures, self.properties)
+    def get_result_cache_key(self, query_options, records_limit):
+        endpoint, mdx_version, username, _, bearer_token = get_credentials(self.config)
+        mdx_query = self.build_query(
+            query_options,
+            limit=records_limit if records_limit is not None and records_limit >= 0 else None
+        )
+        # the token is hashed in the key so that SSO users never read each other's results
+        return ResultCache.get_key(
+            endpoint, mdx_version, self.catalog, mdx_query, self.execute_format,
+            username, ResultCache.get_key(bearer_token) if bearer_token else None,
+            self.batch_targets
+        )
+
+    def get_partition_slicer(self, partition_id):
+        """
+        Partition ids are the unique names of the members, which are used as the slicer as they are.
+        """
+        if not self.partitioning_level or not partition_id:
+            return None
+        if not partition_id.startswith("{}.".format(get_level_dimension(self.partitioning_level))):
+            raise Exception("Partition '{}' is not a member of level {}".format(partition_id, self.partitioning_level))
+        return partition_id
+
+    def iter_rows(self, query_options, records_limit=-1):
+        has_limit = records_limit is not None and records_limit >= 0
+        # batch and sliced reads load their thread pools on first use only
+        if self.batch_targets:
+            from xmla_batch import BatchExecution
+            batch_execution = BatchExecution(
+                lambda: self.get_new_client(pooled=False), self.batch_concurrency, self.source_column
+            )
+            return batch_execution.iter_rows(
+                self.batch_targets,
+                lambda client, catalog, cube: self.iter_target_rows(client, catalog, cube, query_options, records_limit)
+            )
+        if self.parallel_slices > 1 and not has_limit:
+            from xmla_slices import SlicedExecution
+            # each slice worker owns its session, closed at the end of the read
+            sliced_execution = SlicedExecution(
+                lambda: self.get_new_client(pooled=False), self.parallel_slices, self.slice_size
+            )
+            return sliced_execution.iter_rows(
+                lambda start, count: self.build_query(query_options, subset=(start, count))
+            )
+        if self.split_on_limit and not has_limit and self.dimensions:
+            # Queries the server rejects as too large are split on the members of the dimensions
+            adaptive_execution = AdaptiveExecution(
+                self.client, self.cube, self.dimensions,
+                lambda dimension_sets: self.build_query(dict(query_options, dimension_sets=dimension_sets))
+            )
+            return adaptive_execution.iter_rows(query_options.get("dimension_sets"))
+        # With a records limit the server is asked for the first rows only
+        mdx_query = self.build_query(query_options, limit=records_limit if has_limit else None)
         logger.info("mdx_query={}".format(mdx_query))
+        cube = self.client.execute_stream(mdx_query)
+        return cube.iter_rows()
 
-        cube = self.client.execute(mdx_query)
-        error_message = cube.get_error_message()
+    def iter_target_rows(self, client, catalog, cube, query_options, records_limit):
+        has_limit = records_limit is not None and records_limit >= 0
+        mdx_query = self.build_query(query_options, cube=cube, limit=records_limit if has_limit else None)
+        logger.info("Batch target {}/{}: mdx_query={}".format(catalog, cube, mdx_query))
+        return client.execute_stream(mdx_query, catalog=catalog).iter_rows()
 
-        if error_message:
-            raise Exception("Error: {}".format(error_message))
+    def get_incremental_dimension_sets(self, watermark):
+        if not self.incremental_level:
+            return None
+        return get_incremental_dimension_sets(self.incremental_level, watermark)
 
-        cells = cube.get_cells()
-        horizontal_axis, vertical_axis = cube.get_axis()
-        columns_names = cube.get_columns_names()
-        rows_names = cube.get_rows_names()
+    def get_incremental_read(self, partition_id):
+        return IncrementalRead(self.watermark_store, self.get_watermark_key(partition_id), self.incremental_level)
 
-        members = extract_path(vertical_axis[0], ["Member"])
-        left_columns_names = []
-        for member in members:
-            left_columns_names.append(member.get("@Hierarchy", ""))
-        for row in vertical_axis:
-            members = extract_path(row, ["Member"])
-            rows_names.append(extract_members(members))
-        length_horizontal_axis = len(horizontal_axis)
-        length_vertical_axis = len(vertical_axis)
-        counter = 0
-        limit = RecordsLimit(records_limit=records_limit)
-        for row_index in range(0, length_vertical_axis):
-            row = {}
-            left_column_counter = 0
-            for left_column_name in left_columns_names:
-                row[left_column_name] = rows_names[row_index][left_column_counter]
-                left_column_counter += 1
-            for column_index in range(0, length_horizontal_axis):
-                row["{}".format(columns_names[column_index])] = cells[counter].get("Value", {}).get("#text")
-                counter +=1
-            yield row
-            if limit.is_reached():
-                return
+    def fix_incremental_bound(self, incremental_read, query_options):
+        return incremental_read.fix_bound(
+            lambda members_set: self.client.get_last_member(
+                self.cube, members_set, self.measures, slicer=query_options.get("slicer")
+            )
+        )
+
+    def get_watermark_key(self, partition_id):
+        endpoint, mdx_version, _, _, _ = get_credentials(self.config)
+        return get_hashed_key(
+            endpoint, mdx_version, self.catalog, self.cube, self.dimensions, self.measures,
+            self.properties, self.incremental_level, partition_id
+        )
 
     def get_writer(self, dataset_schema=None, dataset_partitioning=None,
                    partition_id=None):
@@ -107,13 +292,38 @@ class XMLAConnector(Connector):
     def get_partitioning(self):
         """
         Return the partitioning schema that the connector defines.
+        Partitions are the members of the level selected in select_partitioning_level.
         """
-        raise NotImplementedError
+        if not self.partitioning_level:
+            raise NotImplementedError
+        return {
+            "dimensions": [
+                {
+                    "name": get_partition_dimension_name(self.partitioning_level),
+                    "type": "value"
+                }
+            ]
+        }
 
     def list_partitions(self, partitioning):
         """Return the list of partitions for the partitioning scheme
         passed as parameter"""
-        return []
+        if not self.partitioning_level:
+            return []
+        members = self.client.discover(
+            "MDSCHEMA_MEMBERS",
+            restrictions={
+                "CATALOG_NAME": self.catalog,
+                "CUBE_NAME": self.cube,
+                "LEVEL_UNIQUE_NAME": self.partitioning_level
+            }
+        )
+        partitions = []
+        for member in members:
+            if member.get("LEVEL_UNIQUE_NAME", self.partitioning_level) == self.partitioning_level:
+                # member names repeat across parents (one Q1 per year), unique names do not
+                partitions.append(member.get("MEMBER_UNIQUE_NAME"))
+        return partitions
 
     def partition_exists(self, partitioning, partition_id):
         """Return whether the partition passed as parameter exists
@@ -121,13 +331,29 @@ class XMLAConnector(Connector):
         Implementation is only required if the corresponding flag is set to True
         in the connector definition
         """
-        raise NotImplementedError
+        return partition_id in self.list_partitions(partitioning)
 
     def get_records_count(self, partitioning=None, partition_id=None):
         """
-        Returns the count of records for the dataset (or a partition).
-
-        Implementation is only required if the corresponding flag is set to True
-        in the connector definition
+        Returns the count of records for the dataset (or a partition),
+        computed by the server with COUNT(NONEMPTY(<rows>, <measures>)).
         """
-        raise NotImplementedError
+        slicer = self.get_partition_slicer(partition_id)
+        dimension_sets = None
+        if self.incremental_level:
+            # the rows the next incremental read returns, up to the same bound
+            incremental_read = self.get_incremental_read(partition_id)
+            if not self.fix_incremental_bound(incremental_read, {"slicer": slicer}):
+                return 0
+            dimension_sets = incremental_read.get_dimension_sets()
+        if self.batch_targets:
+            return sum(
+                self.client.count_rows(
+                    cube, self.dimensions, self.measures,
+                    slicer=slicer, catalog=catalog
+                ) for catalog, cube in self.batch_targets
+            )
+        return self.client.count_rows(
+            self.cube, self.dimensions, self.measures,
+            slicer=slicer, dimension_sets=dimension_sets
+        )
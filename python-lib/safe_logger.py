@@ -2,14 +2,20 @@ import logging
 import copy
 
 
+CONFIGURED_LOGGERS = set()
+
+
 class SafeLogger(object):
     def __init__(self, name, forbidden_keys=None):
         self.name = name
         self.logger = logging.getLogger(self.name)
-        logging.basicConfig(
-            level=logging.INFO,
-            format='{} %(levelname)s - %(message)s'.format(self.name)
-        )
+        if self.name not in CONFIGURED_LOGGERS:
+            # every module creates its SafeLogger at import time, logging is configured by the first one
+            CONFIGURED_LOGGERS.add(self.name)
+            logging.basicConfig(
+                level=logging.INFO,
+                format='{} %(levelname)s - %(message)s'.format(self.name)
+            )
         self.forbidden_keys = forbidden_keys
 
     def info(self, message):
@@ -0,0 +1,95 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from xmla_constants import XMLAConstants
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("xmla plugin", forbidden_keys=["password", "bearer_token"])
+
+
+class AsyncXMLAClient(object):
+    """
+    asyncio front end running independent Discover / Execute calls at once.
+
+    The blocking HTTP round trips run on a thread pool of max_concurrency
+    workers, which is also the number of requests in flight at once. Each
+    worker thread owns the XMLAClient made by client_factory, so that no
+    requests.Session is shared between threads; their sessions are closed
+    by close(). SOAP templates, auth, retries, discover_cache and parsing
+    are those of XMLAClient.
+
+        async_client = AsyncXMLAClient(client_factory)
+        try:
+            dimensions, measures = run_coroutine(async_client.gather(
+                async_client.discover("MDSCHEMA_DIMENSIONS", restrictions),
+                async_client.discover("MDSCHEMA_MEASURES", restrictions)
+            ))
+        finally:
+            async_client.close()
+    """
+    def __init__(self, client_factory, max_concurrency=XMLAConstants.DEFAULT_ASYNC_CONCURRENCY):
+        self.client_factory = client_factory
+        self.max_concurrency = max(1, max_concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        self.worker = threading.local()
+        self.clients = []
+        self.clients_lock = threading.Lock()
+
+    def get_client(self):
+        client = getattr(self.worker, "client", None)
+        if client is None:
+            client = self.client_factory()
+            self.worker.client = client
+            with self.clients_lock:
+                self.clients.append(client)
+        return client
+
+    def call(self, function, *args, **kwargs):
+        return function(self.get_client(), *args, **kwargs)
+
+    async def run(self, function, *args, **kwargs):
+        """
+        Runs function(client, *args, **kwargs) on a worker thread, with the client of that worker.
+        """
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(self.call, function, *args, **kwargs))
+
+    async def discover(self, function_name, restrictions=None, use_cache=True):
+        def discover(client):
+            return client.discover(function_name, restrictions=restrictions, use_cache=use_cache)
+        return await self.run(discover)
+
+    async def execute_rows(self, mdx_query, catalog=None, execute_format=None):
+        """
+        Returns the decoded rows of a query, read in full on a worker thread.
+        """
+        def read_rows(client):
+            return list(client.execute_stream(mdx_query, catalog=catalog, execute_format=execute_format).iter_rows())
+        return await self.run(read_rows)
+
+    async def gather(self, *coroutines):
+        return await asyncio.gather(*coroutines)
+
+    async def execute_many(self, mdx_queries, catalog=None, execute_format=None):
+        return await self.gather(*[
+            self.execute_rows(mdx_query, catalog=catalog, execute_format=execute_format) for mdx_query in mdx_queries
+        ])
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for client in self.clients:
+            client.session.close()
+        self.clients = []
+
+
+def run_coroutine(coroutine):
+    """
+    Runs a coroutine to completion on a private event loop (asyncio.run is Python 3.7+).
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
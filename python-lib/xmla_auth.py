@@ -6,20 +6,30 @@ logger = SafeLogger("xmla plugin", forbidden_keys=["password", "bearer_token"])
 
 
 class XMLAAuth(requests.auth.AuthBase):
-    def __init__(self, version, username, password, bearer_token):
-        self.version = version
+    """
+    auth_type is the auth_type of the credentials preset: basic, bearer-token, ntlm or kerberos.
+    Without auth_type, the bearer token is sent if there is one, else basic auth if there is a username.
+    """
+    def __init__(self, auth_type, username, password, bearer_token):
+        self.auth_type = auth_type
         self.username = username
         self.password = password
         self.bearer_token = bearer_token
-        if version == "basic":
-            return (username, password)
-        if version == "ntml":
+        self.auth = None
+        if auth_type is None:
+            auth_type = "bearer-token" if bearer_token else "basic" if username else None
+        if auth_type == "basic" and username:
+            self.auth = requests.auth.HTTPBasicAuth(username, password or "")
+        elif auth_type == "ntlm":
             from requests_ntlm import HttpNtlmAuth
-            return HttpNtlmAuth(username, password)
-        if version == "kerberos":
+            self.auth = HttpNtlmAuth(username, password)
+        elif auth_type == "kerberos":
             from requests_kerberos import HTTPKerberosAuth
-            return HTTPKerberosAuth(principal=username, password=password)
+            self.auth = HTTPKerberosAuth(principal=username, password=password)
 
     def __call__(self, request):
-        request.headers["Authorization"] = "Bearer {}".format(self.bearer_token)
+        if self.auth is not None:
+            return self.auth(request)
+        if self.bearer_token:
+            request.headers["Authorization"] = "Bearer {}".format(self.bearer_token)
         return request
@@ -0,0 +1,95 @@
+import threading
+from queue import Queue, Empty, Full
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("xmla plugin", forbidden_keys=["password", "bearer_token"])
+
+
+class BatchExecution(object):
+    """
+    Runs the same read on several (catalog, cube) targets, number_of_workers
+    targets at a time, and streams their rows into a single output as they
+    arrive. Each row gets its target, "catalog/cube", in source_column.
+
+    run_target(client, catalog, cube) must return the rows of one target.
+    Each worker thread owns the XMLAClient made by client_factory, whose
+    session is closed at the end of the batch. Rows are handed over in
+    blocks through a bounded queue, so a slow consumer holds back the
+    workers instead of piling rows up in memory.
+    """
+    BLOCK_SIZE = 1000
+    QUEUE_SIZE = 16
+    WAIT_TIMEOUT = 0.5
+
+    def __init__(self, client_factory, number_of_workers, source_column):
+        self.client_factory = client_factory
+        self.number_of_workers = max(1, number_of_workers)
+        self.source_column = source_column
+        self.stopped = threading.Event()
+
+    def run_worker(self, targets, run_target, output):
+        client = None
+        try:
+            client = self.client_factory()
+            while not self.stopped.is_set():
+                try:
+                    catalog, cube = targets.get_nowait()
+                except Empty:
+                    break
+                source = "{}/{}".format(catalog, cube)
+                logger.info("Batch target {} started".format(source))
+                block = []
+                for row in run_target(client, catalog, cube):
+                    row[self.source_column] = source
+                    block.append(row)
+                    if len(block) >= self.BLOCK_SIZE:
+                        if not self.put(output, ("rows", block)):
+                            return
+                        block = []
+                if block and not self.put(output, ("rows", block)):
+                    return
+                logger.info("Batch target {} done".format(source))
+            self.put(output, ("done", None))
+        except Exception as error:
+            self.put(output, ("error", error))
+        finally:
+            if client is not None:
+                client.session.close()
+
+    def put(self, output, item):
+        while not self.stopped.is_set():
+            try:
+                output.put(item, timeout=self.WAIT_TIMEOUT)
+                return True
+            except Full:
+                continue
+        return False
+
+    def iter_rows(self, targets, run_target):
+        pending_targets = Queue()
+        for target in targets:
+            pending_targets.put(target)
+        output = Queue(maxsize=self.QUEUE_SIZE)
+        workers = []
+        for _ in range(min(self.number_of_workers, len(targets))):
+            worker = threading.Thread(target=self.run_worker, args=(pending_targets, run_target, output))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        running_workers = len(workers)
+        try:
+            while running_workers:
+                kind, value = output.get()
+                if kind == "rows":
+                    for row in value:
+                        yield row
+                elif kind == "done":
+                    running_workers -= 1
+                else:
+                    raise value
+        finally:
+            # also reached when the consumer stops early or a target failed
+            self.stopped.set()
+            for worker in workers:
+                worker.join()
@@ -0,0 +1,332 @@
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from xmla_common import get_hashed_key
+from xmla_constants import XMLAConstants
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("xmla plugin", forbidden_keys=["password", "bearer_token"])
+
+
+def make_private_directory(directory):
+    """
+    Creates directory with access for the current user only.
+    Returns False when it can not be created or belongs to another user.
+    """
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        stat = os.stat(directory)
+        if stat.st_uid != os.getuid():
+            return False
+        if stat.st_mode & 0o077:
+            os.chmod(directory, 0o700)
+    except OSError:
+        return False
+    return True
+
+
+def create_private_file(path):
+    # created empty with 0600 whatever the umask, then opened as usual
+    os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600))
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def evict_files(directory, extension, max_size=None, max_entries=None, expires_before=None):
+    """
+    Removes the files of directory ending with extension last modified before
+    expires_before, then the least recently modified ones until the others
+    fit in max_size bytes and max_entries files.
+    """
+    entries = []
+    total_size = 0
+    try:
+        file_names = os.listdir(directory)
+    except OSError:
+        return
+    for file_name in file_names:
+        if not file_name.endswith(extension):
+            continue
+        path = os.path.join(directory, file_name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if expires_before is not None and stat.st_mtime < expires_before:
+            remove_file(path)
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total_size += stat.st_size
+    number_of_entries = len(entries)
+    for _, size, path in sorted(entries):
+        is_too_large = max_size is not None and total_size > max_size
+        has_too_many = max_entries is not None and number_of_entries > max_entries
+        if not is_too_large and not has_too_many:
+            break
+        remove_file(path)
+        total_size -= size
+        number_of_entries -= 1
+
+
+class TTLCache(object):
+    """
+    Small thread safe in-memory cache with a time to live and LRU eviction.
+    """
+    def __init__(self, max_entries=256, ttl=300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, expires_at=None):
+        with self.lock:
+            self.entries[key] = (expires_at or time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class DiscoverCache(TTLCache):
+    """
+    TTLCache also kept on disk, one JSON file per entry, so that entries
+    outlive the process: DSS runs each dataset settings dropdown in a new one.
+    The directory, by default in the temporary directory and per OS user,
+    is only used when it is private to the current user.
+    """
+    def __init__(self, max_entries=256, ttl=300, directory=None):
+        TTLCache.__init__(self, max_entries=max_entries, ttl=ttl)
+        self.directory = directory
+        self.is_directory_private = None
+
+    def get_path(self, key):
+        if self.is_directory_private is None:
+            if not self.directory:
+                self.directory = os.path.join(
+                    tempfile.gettempdir(),
+                    "{}-{}".format(XMLAConstants.DISCOVER_CACHE_DIRECTORY_NAME, os.getuid())
+                )
+            self.is_directory_private = make_private_directory(self.directory)
+        if not self.is_directory_private:
+            return None
+        return os.path.join(self.directory, "{}.json".format(key))
+
+    def get(self, key):
+        value = TTLCache.get(self, key)
+        if value is not None:
+            return value
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path) as cache_file:
+                entry = json.load(cache_file)
+        except (IOError, OSError, ValueError):
+            return None
+        expires_at = entry.get("created", 0) + self.ttl
+        if expires_at < time.time():
+            remove_file(path)
+            return None
+        TTLCache.set(self, key, entry.get("value"), expires_at=expires_at)
+        return entry.get("value")
+
+    def set(self, key, value):
+        TTLCache.set(self, key, value)
+        path = self.get_path(key)
+        if path is None:
+            return
+        temporary_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+        try:
+            create_private_file(temporary_path)
+            with open(temporary_path, "w") as cache_file:
+                json.dump({"created": time.time(), "value": value}, cache_file)
+            os.replace(temporary_path, path)
+        except (IOError, OSError, TypeError, ValueError):
+            # the entry stays in memory only
+            remove_file(temporary_path)
+            return
+        # the disk layer is bounded like the memory one, as it outlives the process
+        evict_files(self.directory, ".json", max_entries=self.max_entries, expires_before=time.time() - self.ttl)
+
+
+# Shared by every XMLAClient of the process, keyed by endpoint, user, hashed token and restrictions
+discover_cache = DiscoverCache(max_entries=256, ttl=300)
+
+
+class ResultCache(object):
+    """
+    On-disk cache of decoded Execute results.
+
+    Each entry is a gzip file: a header line {"created"} followed by one line
+    per block of rows, stored column by column ({"columns": [...], "values":
+    [[...], ...]}) so that entries are compact and can be written and read back
+    as a stream. The rows of a block all have the same keys: a new block starts
+    when they change, as rows of widened rowsets or of several batch targets do.
+    Entries expire after ttl seconds; when the directory grows over max_size
+    bytes, the least recently used entries are removed.
+    """
+    BLOCK_SIZE = 10000
+
+    def __init__(self, directory, ttl=3600, max_size=1024 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        # entries hold query results, so the directory must be private to the user
+        self.is_usable = make_private_directory(self.directory)
+        if not self.is_usable:
+            logger.warning("Result cache disabled, {} can not be used as a directory private to the current user".format(self.directory))
+
+    @staticmethod
+    def get_key(*parts):
+        return get_hashed_key(*parts)
+
+    def get_path(self, key):
+        return os.path.join(self.directory, "{}.json.gz".format(key))
+
+    def get_stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def get(self, key):
+        """
+        Returns a generator on the cached rows, or None on a cache miss.
+        """
+        if not self.is_usable:
+            return None
+        path = self.get_path(key)
+        try:
+            cache_file = gzip.open(path, "rt")
+        except (IOError, OSError):
+            self.misses += 1
+            return None
+        try:
+            header = json.loads(cache_file.readline())
+        except (IOError, OSError, EOFError, ValueError):
+            cache_file.close()
+            self.misses += 1
+            return None
+        if header.get("created", 0) + self.ttl < time.time():
+            cache_file.close()
+            self.remove(path)
+            self.misses += 1
+            return None
+        self.hits += 1
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        # the file stays open, so that the entry can be evicted while it is read
+        return self.iter_cached_rows(cache_file, header.get("columns", []))
+
+    def iter_cached_rows(self, cache_file, columns):
+        with cache_file:
+            for line in cache_file:
+                block = json.loads(line)
+                # entries written before blocks had their own columns use the header ones
+                block_columns = block.get("columns", columns)
+                for row_values in zip(*block.get("values", [])):
+                    yield dict(zip(block_columns, row_values))
+
+    def open_temporary_file(self, temporary_path):
+        if not self.is_usable:
+            return None
+        try:
+            create_private_file(temporary_path)
+            return gzip.open(temporary_path, "wt")
+        except (IOError, OSError) as error:
+            logger.warning("Rows are not cached, {} can not be written: {}".format(temporary_path, error))
+            self.remove(temporary_path)
+            return None
+
+    def iter_and_store(self, key, rows):
+        """
+        Yields rows while writing them to the cache. The entry is only
+        published once the rows have been completely consumed.
+        On a write error, rows keep coming from the server without being cached.
+        """
+        path = self.get_path(key)
+        temporary_path = "{}.{}.tmp".format(path, os.getpid())
+        columns = None
+        block = []
+        completed = False
+        cache_file = self.open_temporary_file(temporary_path)
+        try:
+            if cache_file is not None:
+                try:
+                    cache_file.write(json.dumps({"created": time.time()}) + "\n")
+                except (IOError, OSError) as error:
+                    cache_file = self.discard(cache_file, temporary_path, error)
+            for row in rows:
+                if cache_file is not None:
+                    try:
+                        row_columns = list(row.keys())
+                        if row_columns != columns or len(block) >= self.BLOCK_SIZE:
+                            self.write_block(cache_file, columns, block)
+                            columns = row_columns
+                            block = []
+                        block.append(row)
+                    except (IOError, OSError) as error:
+                        cache_file = self.discard(cache_file, temporary_path, error)
+                yield row
+            if cache_file is not None:
+                try:
+                    self.write_block(cache_file, columns, block)
+                    cache_file.close()
+                    os.replace(temporary_path, path)
+                    cache_file = None
+                    completed = True
+                except (IOError, OSError) as error:
+                    cache_file = self.discard(cache_file, temporary_path, error)
+        finally:
+            if cache_file is not None:
+                self.discard(cache_file, temporary_path)
+            if completed:
+                self.evict()
+
+    def discard(self, cache_file, temporary_path, error=None):
+        if error is not None:
+            logger.warning("Rows are not cached, {} can not be written: {}".format(temporary_path, error))
+        try:
+            cache_file.close()
+        except (IOError, OSError):
+            pass
+        self.remove(temporary_path)
+        return None
+
+    def write_block(self, cache_file, columns, block):
+        if not block:
+            return
+        values = [[row[column] for row in block] for column in columns]
+        cache_file.write(json.dumps({"columns": columns, "values": values}) + "\n")
+
+    def evict(self):
+        evict_files(self.directory, ".json.gz", max_size=self.max_size)
+
+    def remove(self, path):
+        remove_file(path)
@@ -1,19 +1,24 @@
+import functools
 import requests
-import xmltodict
-from xmla_common import extract_path
+from xmla_common import get_hashed_key, extract_path, combine_members, format_property, AxisTuples
 from safe_logger import SafeLogger
 from xmla_constants import XMLAConstants
 from xmla_auth import XMLAAuth
-import os
+from xmla_pool import build_session, session_pool
+from xmla_types import ValueConverter
+from xmla_metrics import XMLAMetrics
+import time
+from xml.sax.saxutils import escape
+from xmla_cache import discover_cache
 
 
 logger = SafeLogger("xmla plugin", forbidden_keys=["password", "bearer_token"])
 
 
 DISCOVER_REQUESTS = {
-    XMLAConstants.MONDRIAN: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Discover><RequestType>{}</RequestType><Restrictions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:nil="true"/><Properties xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:nil="true"/></Discover></soap-env:Body></soap-env:Envelope>',
-    XMLAConstants.SAP_BW: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Discover><RequestType>{}</RequestType><Restrictions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:nil="true"/><Properties xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:nil="true"/></Discover></soap-env:Body></soap-env:Envelope>',
-    XMLAConstants.POWER_BI: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Discover><RequestType>{}</RequestType><Restrictions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:nil="true"/><Properties xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:nil="true"/></Discover></soap-env:Body></soap-env:Envelope>'
+    XMLAConstants.MONDRIAN: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Discover><RequestType>{}</RequestType>{}<Properties xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:nil="true"/></Discover></soap-env:Body></soap-env:Envelope>',
+    XMLAConstants.SAP_BW: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Discover><RequestType>{}</RequestType>{}<Properties xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:nil="true"/></Discover></soap-env:Body></soap-env:Envelope>',
+    XMLAConstants.POWER_BI: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Discover><RequestType>{}</RequestType>{}<Properties xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:nil="true"/></Discover></soap-env:Body></soap-env:Envelope>'
 }
 
 DISCOVER_PATHS = {
@@ -22,23 +27,56 @@ DISCOVER_PATHS = {
     XMLAConstants.POWER_BI: ["SOAP-ENV:Envelope", "SOAP-ENV:Body", "DiscoverResponse", "return", "root", "row"]
 }
 
+NIL_RESTRICTIONS = '<Restrictions xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:nil="true"/>'
+
 EXECUTE_REQUESTS = {
-    XMLAConstants.MONDRIAN: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Execute><Command><Statement>{}</Statement></Command><Properties><PropertyList><Format>Multidimensional</Format><AxisFormat>TupleFormat</AxisFormat><Catalog>FoodMart</Catalog></PropertyList></Properties></Execute></soap-env:Body></soap-env:Envelope>',
-    XMLAConstants.SAP_BW: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Execute><Command><Statement>{}</Statement></Command><Properties><PropertyList><Format>Multidimensional</Format><AxisFormat>TupleFormat</AxisFormat><Catalog>FoodMart</Catalog></PropertyList></Properties></Execute></soap-env:Body></soap-env:Envelope>',
-    XMLAConstants.POWER_BI: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Execute><Command><Statement>{}</Statement></Command><Properties><PropertyList><Format>Multidimensional</Format><AxisFormat>TupleFormat</AxisFormat><Catalog>FoodMart</Catalog></PropertyList></Properties></Execute></soap-env:Body></soap-env:Envelope>'
+    XMLAConstants.MONDRIAN: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Execute><Command><Statement>{}</Statement></Command><Properties><PropertyList><Format>{}</Format><AxisFormat>TupleFormat</AxisFormat>{}</PropertyList></Properties></Execute></soap-env:Body></soap-env:Envelope>',
+    XMLAConstants.SAP_BW: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Execute><Command><Statement>{}</Statement></Command><Properties><PropertyList><Format>{}</Format><AxisFormat>TupleFormat</AxisFormat>{}</PropertyList></Properties></Execute></soap-env:Body></soap-env:Envelope>',
+    XMLAConstants.POWER_BI: '<?xml version=\'1.0\' encoding=\'utf-8\'?>\n<soap-env:Envelope xmlns:soap-env="http://schemas.xmlsoap.org/soap/envelope/" xmlns="urn:schemas-microsoft-com:xml-analysis"><soap-env:Body><Execute><Command><Statement>{}</Statement></Command><Properties><PropertyList><Format>{}</Format><AxisFormat>TupleFormat</AxisFormat>{}</PropertyList></Properties></Execute></soap-env:Body></soap-env:Envelope>'
+}
+
+# stands for the request body in the templates given to compile_envelope
+BODY_MARKER = "\x00body\x00"
+
+LIMIT_FUNCTIONS = {
+    # {0}: rows set, {1}: number of rows to keep
+    XMLAConstants.MONDRIAN: "HEAD({0}, {1})",
+    XMLAConstants.SAP_BW: "SUBSET({0}, 0, {1})",
+    XMLAConstants.POWER_BI: "HEAD({0}, {1})"
 }
 
 
 class XMLAClient(object):
-    def __init__(self, endpoint, version=None, username=None, password=None, bearer_token=None):
-        self.session = requests.Session()
-        self.session.auth = XMLAAuth(version, username, password, bearer_token)
+    def __init__(self, endpoint, version=None, username=None, password=None, bearer_token=None, execute_format=None, metrics=None,
+                 connect_timeout=None, read_timeout=None, max_retries=None, auth_type=None, pooled=True,
+                 catalog=None, properties=None):
+        """
+        With pooled, the session comes from the process-wide session_pool and must not be closed by the caller.
+        """
+        max_retries = XMLAConstants.DEFAULT_MAX_RETRIES if max_retries is None else max_retries
+        if pooled:
+            self.session = session_pool.get_session(
+                endpoint, auth_type=auth_type, username=username, password=password,
+                bearer_token=bearer_token, max_retries=max_retries
+            )
+        else:
+            self.session = build_session(max_retries)
+            self.session.auth = XMLAAuth(auth_type, username, password, bearer_token)
+        self.timeout = (
+            connect_timeout or XMLAConstants.DEFAULT_CONNECT_TIMEOUT,
+            read_timeout or XMLAConstants.DEFAULT_READ_TIMEOUT
+        )
         self.version = version or XMLAConstants.XMLA_DEFAULT_VERSION
         self.endpoint = endpoint
-        if self.version == XMLAConstants.SAP_BW:
-            self.format_dimensions = self.format_sap_dimensions
-        else:
-            self.format_dimensions = self.format_mondrian_dimensions
+        self.username = username
+        # Discover rowsets can be filtered by role, so SSO users get their own cache entries
+        self.token_key = get_hashed_key(bearer_token) if bearer_token else None
+        # sent as the Catalog property of Execute requests
+        self.catalog = catalog
+        # DIMENSION PROPERTIES of the queries, decoded by the streamed readers
+        self.properties = properties
+        self.execute_format = execute_format or XMLAConstants.MULTIDIMENSIONAL
+        self.metrics = metrics or XMLAMetrics()
 
     def get_headers(self):
         return {
@@ -46,99 +84,242 @@ class XMLAClient(object):
             'Content-Type': 'text/xml; charset=utf-8'
         }
 
-    def discover(self, function_name):
-        data = DISCOVER_REQUESTS[self.version].format(function_name)
+    def discover(self, function_name, restrictions=None, use_cache=True):
+        """
+        Returns the rows of a Discover rowset.
+        restrictions, e.g. {"CATALOG_NAME": "FoodMart", "CUBE_NAME": "Sales"},
+        are sent to the server so that it only returns the matching rows.
+        """
+        restrictions = restrictions or {}
+        cache_key = get_hashed_key(
+            self.endpoint, self.version, self.username, self.token_key, function_name,
+            sorted(restrictions.items())
+        )
+        if use_cache:
+            rows = discover_cache.get(cache_key)
+            if rows is not None:
+                return rows
+        head, tail = compile_envelope(DISCOVER_REQUESTS[self.version], function_name, BODY_MARKER)
+        data = head + format_restrictions(restrictions) + tail
         json_response = self.post_xmla(data)
         rows = extract_path(json_response, DISCOVER_PATHS[self.version])
+        if use_cache:
+            discover_cache.set(cache_key, rows)
         return rows
 
     def execute(self, mdx_query):
-        data = EXECUTE_REQUESTS[self.version].format(mdx_query)
+        head, tail = compile_envelope(EXECUTE_REQUESTS[self.version], BODY_MARKER, XMLAConstants.MULTIDIMENSIONAL, format_catalog(self.catalog))
+        data = head + escape(mdx_query) + tail
         json_response = self.post_xmla(data)
         cube = Cube(json_response, version = self.version)
         return cube
 
+    def execute_stream(self, mdx_query, execute_format=None, catalog=None):
+        execute_format = execute_format or self.execute_format
+        head, tail = compile_envelope(EXECUTE_REQUESTS[self.version], BODY_MARKER, execute_format, format_catalog(catalog or self.catalog))
+        response = self.post_xmla_stream(head + escape(mdx_query) + tail)
+        # the streaming parsers are only loaded by the code paths running queries
+        from xmla_stream import StreamedCube, StreamedRowset
+        if execute_format == XMLAConstants.TABULAR:
+            return StreamedRowset(response, metrics=self.metrics)
+        return StreamedCube(response, metrics=self.metrics, properties=self.properties)
+
+    def get_set_members(self, cube, members_set):
+        """
+        Returns the unique names of the members of a set, without any cell.
+        """
+        mdx_query = "SELECT {{}} ON COLUMNS, {{{}}} ON ROWS FROM [{}]".format(members_set, cube)
+        streamed_cube = self.execute_stream(mdx_query, execute_format=XMLAConstants.MULTIDIMENSIONAL)
+        unique_names = []
+        seen_unique_names = set()
+        for members in streamed_cube.iter_tuples(XMLAConstants.VERTICAL_AXIS):
+            unique_name = members[0].get("UName") if members else None
+            if unique_name and unique_name not in seen_unique_names:
+                seen_unique_names.add(unique_name)
+                unique_names.append(unique_name)
+        return unique_names
+
+    def get_last_member(self, cube, members_set, measures, slicer=None):
+        """
+        Returns the unique name of the last member of members_set having data, or None.
+        """
+        mdx_query = "SELECT {{{}}} ON COLUMNS, TAIL(NONEMPTY({}, {{{}}}), 1) ON ROWS FROM [{}]".format(
+            self.format_measures(measures),
+            members_set,
+            self.format_measures(measures),
+            cube
+        )
+        if slicer:
+            mdx_query = "{} WHERE ({})".format(mdx_query, slicer)
+        logger.info("last member mdx_query={}".format(mdx_query))
+        streamed_cube = self.execute_stream(mdx_query, execute_format=XMLAConstants.MULTIDIMENSIONAL)
+        members = streamed_cube.read_first_tuple(XMLAConstants.VERTICAL_AXIS)
+        if not members:
+            return None
+        return members[-1].get("UName")
+
+    def count_rows(self, cube, dimensions, measures, slicer=None, catalog=None, dimension_sets=None):
+        if not self.format_rows_set(dimensions, dimension_sets=dimension_sets):
+            # the read sends an empty ROWS set too, and gets no rows back
+            return 0
+        mdx_query = self.build_count_query(
+            cube, dimensions, measures, slicer=slicer, dimension_sets=dimension_sets
+        )
+        logger.info("count mdx_query={}".format(mdx_query))
+        streamed_cube = self.execute_stream(mdx_query, execute_format=XMLAConstants.MULTIDIMENSIONAL, catalog=catalog)
+        value = streamed_cube.read_first_cell()
+        return int(float(value)) if value is not None else 0
+
     def post_xmla(self, data):
+        # only Discover and buffered Execute responses go through xmltodict
+        import xmltodict
+        start = time.time()
         response = self.session.post(
             url=self.endpoint,
             data=data,
-            headers=self.get_headers()
+            headers=self.get_headers(),
+            timeout=self.timeout
         )
+        self.metrics.add("request_latency", time.time() - start)
+        self.metrics.add("requests")
         assert_response_ok(response)
+        self.metrics.add("bytes_received", len(response.content))
+        start = time.time()
         json_response = xmltodict.parse(response.content)
+        self.metrics.add("parse_time", time.time() - start)
         return json_response
 
-    def build_mdx_query(self, cube, dimensions, measures, properties):
+    def post_xmla_stream(self, data):
+        start = time.time()
+        response = self.session.post(
+            url=self.endpoint,
+            data=data,
+            headers=self.get_headers(),
+            timeout=self.timeout,
+            stream=True
+        )
+        # with stream=True, post returns as soon as the headers are received
+        self.metrics.add("request_latency", time.time() - start)
+        self.metrics.add("requests")
+        assert_response_ok(response)
+        # let urllib3 undo any gzip / deflate encoding while the parser reads
+        response.raw.decode_content = True
+        return response
+
+    def build_mdx_query(self, cube, dimensions, measures, properties, subset=None, limit=None, slicer=None,
+                        dimension_sets=None, non_empty_columns=True):
+        """
+        Without non_empty_columns, every measure is returned on COLUMNS, even when its cells are all empty.
+        """
         # MDX versions adaptation here
-        if self.version == XMLAConstants.SAP_BW:
-            mdx_query = "SELECT NON EMPTY {{{}}} ON COLUMNS, NON EMPTY {{{}}} ON ROWS {} FROM [{}]".format(
-                self.format_measures(measures),
-                self.format_dimensions(dimensions),
-                self.format_properties(properties),
-                cube
-            )
-        else:
-            mdx_query = "SELECT NON EMPTY {{{}}} ON COLUMNS, NON EMPTY {{{}}} ON ROWS FROM [{}]".format(
-                self.format_measures(measures),
-                self.format_dimensions(dimensions, properties),
-                cube
-            )
+        rows_set = self.format_rows_set(dimensions, dimension_sets=dimension_sets)
+        if subset:
+            start, count = subset
+            rows_set = self.format_subset(rows_set, measures, start, count)
+        elif limit is not None and limit >= 0:
+            rows_set = self.format_limit(rows_set, measures, limit)
+        mdx_query = "SELECT {}{{{}}} ON COLUMNS, NON EMPTY {{{}}}{} ON ROWS FROM [{}]".format(
+            "NON EMPTY " if non_empty_columns else "",
+            self.format_measures(measures),
+            rows_set,
+            self.format_properties(properties),
+            cube
+        )
+        if slicer:
+            mdx_query = "{} WHERE ({})".format(mdx_query, slicer)
         return mdx_query
-    
+
+    def build_count_query(self, cube, dimensions, measures, slicer=None, dimension_sets=None):
+        # Only the number of non empty ROWS tuples travels back, as a single cell
+        mdx_query = "WITH MEMBER {0} AS COUNT(NONEMPTY({{{1}}}, {{{2}}})) SELECT {{{0}}} ON COLUMNS FROM [{3}]".format(
+            XMLAConstants.COUNT_MEASURE,
+            self.format_rows_set(dimensions, dimension_sets=dimension_sets),
+            self.format_measures(measures),
+            cube
+        )
+        if slicer:
+            mdx_query = "{} WHERE ({})".format(mdx_query, slicer)
+        return mdx_query
+
+    def format_rows_set(self, dimensions, dimension_sets=None):
+        """
+        dimension_sets, e.g. {"[Time]": "{[Time].[1997].[Q3]:NULL}"}, replaces the
+        default .Children set of a dimension. Dimensions of dimension_sets that are
+        not selected are crossjoined at the end of the ROWS set.
+        """
+        dimension_sets = dimension_sets or {}
+        rows_set = self.format_dimensions(dimensions, dimension_sets=dimension_sets)
+        extra_sets = [members_set for dimension, members_set in dimension_sets.items() if dimension not in dimensions]
+        return " * ".join([token for token in [rows_set] + extra_sets if token])
+
+    def format_subset(self, rows_set, measures, start, count):
+        # Empty tuples are removed before slicing so that each slice holds exactly count rows
+        return "SUBSET(NONEMPTY({{{}}}, {{{}}}), {}, {})".format(
+            rows_set,
+            self.format_measures(measures),
+            start,
+            count
+        )
+
+    def format_limit(self, rows_set, measures, limit):
+        return LIMIT_FUNCTIONS[self.version].format(
+            "NONEMPTY({{{}}}, {{{}}})".format(rows_set, self.format_measures(measures)),
+            limit
+        )
+
     def format_measures(self, measures):
         # MDX versions adaptation here
         return "{}".format(', '.join(measures))
     
-    def format_sap_dimensions(self, dimensions):
-        # MDX versions adaptation here
-        return "{}".format('.Children * '.join(dimensions) + '.Children')
-    
-    def format_mondrian_dimensions(self, dimensions, properties):
-        # MDX versions adaptation here
-        matched_properties = []
-        for dimension in dimensions:
-            match = None
-            for property in properties:
-                if property.startswith(dimension):
-                    match = property
-            matched_properties.append(match)
-        formated_dimensions = []
-        for dimension, matched_property in zip(dimensions, matched_properties):
-            token = ""
-            if matched_property:
-                common = os.path.commonprefix([dimension + ".", matched_property])
-                property_name = matched_property[len(common):]
-                token = "{}.CurrentMember.Properties(\"{}\")".format(dimension, property_name)
-            else:
-                token = "{}.Children".format(dimension)
-            formated_dimensions.append(token)
-        return " * ".join(formated_dimensions)
-    
+    def format_dimensions(self, dimensions, dimension_sets=None):
+        dimension_sets = dimension_sets or {}
+        return " * ".join(
+            dimension_sets.get(dimension, "{}.Children".format(dimension)) for dimension in dimensions
+        )
+
     def format_properties(self, properties):
-        # MDX versions adaptation here
-        property_string = ""
-        if self.version == XMLAConstants.SAP_BW and properties:
-            property_string = "DIMENSION PROPERTIES {} ON ROWS".format(
-                ", ".join(properties)
-            )
-        return property_string
+        """
+        Member properties are requested on the ROWS axis and come back inside
+        the member elements of each tuple, so the shape of the axis is unchanged.
+        """
+        if not properties:
+            return ""
+        return " DIMENSION PROPERTIES {}".format(
+            ", ".join(format_property(property) for property in properties)
+        )
 
 
 class Cube(object):
     def __init__(self, json_response, version):
         self.version = XMLAConstants.XMLA_DEFAULT_VERSION or version
         self.json = json_response
+        self.cells = None
+        self.cells_by_ordinal = None
         self.horizontal_axis = None
         self.vertical_axis = None
+        self.columns_names = None
+        self.rows_tuples = None
 
     def get_cells(self):
-        return extract_path(self.json, ["SOAP-ENV:Envelope", "SOAP-ENV:Body", "ExecuteResponse", "return", "root", "CellData", "Cell"])
+        if self.cells is None:
+            self.cells = extract_path(self.json, ["SOAP-ENV:Envelope", "SOAP-ENV:Body", "ExecuteResponse", "return", "root", "CellData", "Cell"])
+        return self.cells
+
+    def get_cells_by_ordinal(self):
+        # Servers omit empty cells, so the position in CellData is not the cell ordinal
+        if self.cells_by_ordinal is None:
+            self.cells_by_ordinal = {}
+            for counter, cell in enumerate(self.get_cells()):
+                cell_ordinal = int(cell.get("@CellOrdinal", counter))
+                self.cells_by_ordinal[cell_ordinal] = cell
+        return self.cells_by_ordinal
 
     def get_axis(self):
-        axes = extract_path(self.json, ["SOAP-ENV:Envelope", "SOAP-ENV:Body", "ExecuteResponse", "return", "root", "Axes", "Axis"])
-        horizontal_axis = extract_path(axes[XMLAConstants.HORIZONTAL_AXIS], ["Tuples", "Tuple"])
-        vertical_axis = extract_path(axes[XMLAConstants.VERTICAL_AXIS], ["Tuples", "Tuple"])
-        return horizontal_axis, vertical_axis
+        if self.horizontal_axis is None or self.vertical_axis is None:
+            axes = extract_path(self.json, ["SOAP-ENV:Envelope", "SOAP-ENV:Body", "ExecuteResponse", "return", "root", "Axes", "Axis"])
+            self.horizontal_axis = extract_path(axes[XMLAConstants.HORIZONTAL_AXIS], ["Tuples", "Tuple"])
+            self.vertical_axis = extract_path(axes[XMLAConstants.VERTICAL_AXIS], ["Tuples", "Tuple"])
+        return self.horizontal_axis, self.vertical_axis
 
     def get_error_message(self):
         error_message = extract_path(self.json, ["SOAP-ENV:Envelope", "SOAP-ENV:Body", "SOAP-ENV:Fault", "detail", "Error", "@Description"])
@@ -148,34 +329,75 @@ class Cube(object):
         error_message = self.get_error_message()
         if error_message:
             raise Exception("Error: {}".format(error_message))
-        
+
     def get_columns_names(self):
-        columns_names = []
-        if not self.horizontal_axis:
-            self.horizontal_axis, self.vertical_axis= self.get_axis()
-        members = extract_path(self.horizontal_axis[0], ["Member"])
-        for column in self.horizontal_axis:
-            members = extract_path(column, ["Member"])
-            columns_names.append(combine_members(members))
-        return columns_names
-    
+        if self.columns_names is None:
+            horizontal_axis, _ = self.get_axis()
+            self.columns_names = [combine_members(extract_path(column, ["Member"])) for column in horizontal_axis]
+        return self.columns_names
+
+    def get_rows_tuples(self):
+        if self.rows_tuples is None:
+            _, vertical_axis = self.get_axis()
+            self.rows_tuples = AxisTuples()
+            for row in vertical_axis:
+                self.rows_tuples.append(extract_path(row, ["Member"]))
+        return self.rows_tuples
+
+    def get_left_columns_names(self):
+        return self.get_rows_tuples().hierarchies or []
+
     def get_rows_names(self):
-        rows_names = []
-        if not self.vertical_axis:
-            self.horizontal_axis, self.vertical_axis= self.get_axis()
-        members = extract_path(self.vertical_axis[0], ["Member"])
-        left_columns_names = []
-        for member in members:
-            left_columns_names.append(member.get("@Hierarchy", ""))
-        for row in self.vertical_axis:
-            members = extract_path(row, ["Member"])
-            rows_names.append(extract_members(members))
-        return rows_names
-    
+        rows_tuples = self.get_rows_tuples()
+        return [rows_tuples.get_captions(row_index) for row_index in range(len(rows_tuples))]
+
     def get_size(self):
-        if not self.horizontal_axis or not self.vertical_axis:
-            self.horizontal_axis, self.vertical_axis= self.get_axis()
-        return len(self.horizontal_axis), len(self.vertical_axis)
+        horizontal_axis, vertical_axis = self.get_axis()
+        return len(horizontal_axis), len(vertical_axis)
+
+    def iter_rows(self):
+        cells_by_ordinal = self.get_cells_by_ordinal()
+        columns_names = self.get_columns_names()
+        left_columns_names = self.get_left_columns_names()
+        value_converter = ValueConverter()
+        rows_tuples = self.get_rows_tuples()
+        cell_ordinal = 0
+        for row_index in range(len(rows_tuples)):
+            row = dict(zip(left_columns_names, rows_tuples.get_captions(row_index)))
+            for column_name in columns_names:
+                value = cells_by_ordinal.get(cell_ordinal, {}).get("Value")
+                if isinstance(value, dict):
+                    value = value_converter.convert(value.get("#text"), value.get("@xsi:type"))
+                row[column_name] = value
+                cell_ordinal += 1
+            yield row
+
+
+def format_restrictions(restrictions):
+    if not restrictions:
+        return NIL_RESTRICTIONS
+    restriction_list = "".join(
+        "<{0}>{1}</{0}>".format(key, escape("{}".format(value)))
+        for key, value in sorted(restrictions.items())
+        if value is not None
+    )
+    return "<Restrictions><RestrictionList>{}</RestrictionList></Restrictions>".format(restriction_list)
+
+
+@functools.lru_cache(maxsize=64)
+def compile_envelope(template, *values):
+    """
+    Returns the (head, tail) of a SOAP template formatted with values, around
+    the BODY_MARKER one, so that building a request is a concatenation.
+    """
+    head, _, tail = template.format(*values).partition(BODY_MARKER)
+    return head, tail
+
+
+def format_catalog(catalog):
+    if not catalog:
+        return ""
+    return "<Catalog>{}</Catalog>".format(escape(catalog))
 
 
 def assert_response_ok(response):
@@ -187,22 +409,12 @@ def assert_response_ok(response):
     status_code = response.status_code
     if status_code >= 400:
         error_message = "Error {} on {}".format(status_code, response.url)
-        
+        from xmla_stream import get_response_fault
+        fault_description = get_response_fault(response.content)
+        if fault_description:
+            error_message = "{}: {}".format(error_message, fault_description)
+
     if error_message:
         logger.error("{}".format(error_message))
         logger.error("Dumping content: {}".format(response.content))
         raise Exception(error_message)
-
-
-def combine_members(members):
-    all_members = []
-    for member in members:
-        all_members.append(member.get("Caption", ""))
-    return "|".join(all_members)
-
-
-def extract_members(members):
-    all_members = []
-    for member in members:
-        all_members.append(member.get("Caption", ""))
-    return all_members
@@ -1,11 +1,26 @@
-import copy
+import hashlib
+import json
+import re
+from array import array
 from xmla_constants import XMLAConstants
 
 
+ENCODED_CHARACTER = re.compile("_x([0-9A-Fa-f]{4})_")
+
+# [bracketed part] or plain part of an MDX name, "]]" being an escaped "]"
+MDX_NAME_PART = re.compile(r"\[((?:[^\]]|\]\])*)\]|([^.\[\]]+)")
+
+# Member children that are not member properties
+MEMBER_FIELDS = frozenset(["@Hierarchy", "UName", "Caption", "LName", "LNum", "DisplayInfo", "MEMBER_CAPTION"])
+
+
 def extract_path(json_response, path_tokens):
-    extract = copy.deepcopy(json_response)
+    # Read-only walk: the returned objects belong to json_response, callers must not mutate them
+    extract = json_response
     for path_token in path_tokens:
-        extract = extract.pop(path_token, {})
+        if not isinstance(extract, dict):
+            return []
+        extract = extract.get(path_token, {})
         if extract is None:
             return []
     if not extract:
@@ -27,13 +42,207 @@ def get_credentials(config):
     return endpoint, mdx_version, username, password, bearer_token
 
 
+def get_auth_type(config):
+    authentication_type = config.get("authentication_type", "None")
+    credentials = config.get("{}_credentials".format(authentication_type), {})
+    auth_type = credentials.get("auth_type")
+    if not auth_type and authentication_type == "oauth_personal":
+        auth_type = "bearer-token"
+    return auth_type
+
+
+def get_batch_targets(config):
+    """
+    (catalog, cube) targets of the batch mode, from the batch_targets key / value list.
+    """
+    targets = []
+    for target in config.get("batch_targets") or []:
+        catalog, cube = target.get("from"), target.get("to")
+        if catalog and cube:
+            targets.append((catalog, cube))
+    return targets
+
+
+def decode_column_name(name):
+    # Rowset column names are XML encoded, e.g. _x005B_Measures_x005D_ for [Measures]
+    return ENCODED_CHARACTER.sub(lambda match: chr(int(match.group(1), 16)), name)
+
+
+def get_name_parts(unique_name):
+    # "[Store].[Store Name].Store Type" -> ["Store", "Store Name", "Store Type"]
+    return [
+        bracketed.replace("]]", "]") if bracketed else plain.strip()
+        for bracketed, plain in MDX_NAME_PART.findall(unique_name or "")
+    ]
+
+
+def format_property(property_name):
+    # "[Store].Store Type" -> "[Store].[Store Type]"
+    return ".".join("[{}]".format(part.replace("]", "]]")) for part in get_name_parts(property_name))
+
+
+def get_member_properties(member, slots):
+    """
+    Values of the member properties found in a member, in slot order.
+    slots maps the short name of a property ("Store Type") to its slot. The
+    member keys are the (XML encoded) names used by the server, such as
+    "_x005B_Store_x005D_._x005B_Store_x0020_Type_x005D_" or "Store_x0020_Type".
+    """
+    values = [None] * len(slots)
+    for key, value in member.items():
+        if key in MEMBER_FIELDS:
+            continue
+        parts = get_name_parts(decode_column_name(key))
+        slot = slots.get(parts[-1]) if parts else None
+        if slot is not None:
+            values[slot] = value
+    return values
+
+
+def combine_members(members):
+    all_members = []
+    for member in members:
+        all_members.append(member.get("Caption", ""))
+    return "|".join(all_members)
+
+
+class MemberDictionary(object):
+    """
+    Members of one hierarchy, each stored once. Tuples refer to a member
+    by its index in the dictionary instead of carrying their own strings.
+    The member properties in property_slots are decoded once per member too,
+    into one list of values per property.
+    """
+    __slots__ = ("hierarchy", "captions", "unique_names", "indexes", "property_slots", "properties")
+
+    def __init__(self, hierarchy, property_slots=None):
+        self.hierarchy = hierarchy
+        self.captions = []
+        self.unique_names = []
+        self.indexes = {}
+        self.property_slots = property_slots or {}
+        self.properties = [[] for _ in self.property_slots]
+
+    def add(self, member):
+        caption = member.get("Caption", "")
+        key = member.get("UName") or caption
+        index = self.indexes.get(key)
+        if index is None:
+            index = len(self.captions)
+            self.indexes[key] = index
+            self.captions.append(caption)
+            self.unique_names.append(member.get("UName"))
+            if self.property_slots:
+                for values, value in zip(self.properties, get_member_properties(member, self.property_slots)):
+                    values.append(value)
+        return index
+
+
+class AxisTuples(object):
+    """
+    Tuples of an axis stored column-wise: one array of member indexes per
+    hierarchy, pointing into that hierarchy's MemberDictionary.
+
+    properties are the DIMENSION PROPERTIES requested on the axis, e.g.
+    "[Store].[Store Name].[Store Type]". Each one is read from the members of
+    the first hierarchy of its dimension; it stays empty if there is none.
+    """
+    __slots__ = ("hierarchies", "dictionaries", "positions", "length", "properties", "property_columns")
+
+    def __init__(self, properties=None):
+        self.hierarchies = None
+        self.dictionaries = None
+        self.positions = None
+        self.length = 0
+        self.properties = properties or []
+        self.property_columns = None
+
+    def __len__(self):
+        return self.length
+
+    def append(self, members):
+        if self.dictionaries is None:
+            self.hierarchies = [member.get("@Hierarchy", "") for member in members]
+            self.dictionaries = [
+                MemberDictionary(hierarchy, property_slots)
+                for hierarchy, property_slots in zip(self.hierarchies, self.assign_properties())
+            ]
+            self.positions = [array("i") for _ in members]
+        for positions, dictionary, member in zip(self.positions, self.dictionaries, members):
+            positions.append(dictionary.add(member))
+        self.length += 1
+
+    def assign_properties(self):
+        """
+        Returns the property slots of each hierarchy, and sets property_columns
+        to the (hierarchy index, slot) of each property, or None when no
+        hierarchy of its dimension is on the axis.
+        """
+        dimensions = [get_name_parts(hierarchy)[:1] for hierarchy in self.hierarchies]
+        slots_by_hierarchy = [{} for _ in self.hierarchies]
+        self.property_columns = []
+        for property_name in self.properties:
+            parts = get_name_parts(property_name)
+            hierarchy_index = dimensions.index(parts[:1]) if parts[:1] in dimensions else None
+            if hierarchy_index is None or len(parts) < 2:
+                self.property_columns.append(None)
+                continue
+            slots = slots_by_hierarchy[hierarchy_index]
+            slot = slots.setdefault(parts[-1], len(slots))
+            self.property_columns.append((hierarchy_index, slot))
+        return slots_by_hierarchy
+
+    def get_columns_names(self):
+        return (self.hierarchies or []) + list(self.properties)
+
+    def get_columns(self, start, end):
+        """
+        Captions of each hierarchy, then values of each property, for the tuples start to end.
+        """
+        if self.dictionaries is None:
+            return []
+        columns = [
+            [dictionary.captions[index] for index in positions[start:end]]
+            for dictionary, positions in zip(self.dictionaries, self.positions)
+        ]
+        for property_column in self.property_columns:
+            if property_column is None:
+                columns.append([None] * (end - start))
+                continue
+            hierarchy_index, slot = property_column
+            values = self.dictionaries[hierarchy_index].properties[slot]
+            columns.append([values[index] for index in self.positions[hierarchy_index][start:end]])
+        return columns
+
+    def get_captions(self, index):
+        return [
+            dictionary.captions[positions[index]]
+            for dictionary, positions in zip(self.dictionaries, self.positions)
+        ]
+
+
+def get_hashed_key(*parts):
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def get_level_dimension(level_unique_name):
+    # "[Time].[Month]" -> "[Time]"
+    return "{}]".format(level_unique_name.split("].[")[0]) if "].[" in level_unique_name else level_unique_name
+
+
+def get_partition_dimension_name(level_unique_name):
+    # "[Time].[Year]" -> "Time_Year"
+    return re.sub(r"[^0-9A-Za-z]+", "_", level_unique_name or "").strip("_")
+
+
 class RecordsLimit():
     def __init__(self, records_limit=-1):
-        self.has_no_limit = (records_limit == -1)
+        self.has_no_limit = (records_limit is None or records_limit < 0)
         self.records_limit = records_limit
         self.counter = 0
 
     def is_reached(self):
+        # counts the record about to be returned
         if self.has_no_limit:
             return False
         self.counter += 1
@@ -1,8 +1,37 @@
 class XMLAConstants(object):
+    BATCH_SOURCE_COLUMN = "xmla_source"
+    COUNT_MEASURE = "[Measures].[XMLA Records Count]"
+    DEFAULT_ASYNC_CONCURRENCY = 4
+    DEFAULT_BACKOFF_FACTOR = 1
+    DEFAULT_BATCH_CONCURRENCY = 4
+    DEFAULT_CONNECT_TIMEOUT = 30
+    DEFAULT_MAX_RETRIES = 3
+    DEFAULT_MAX_SPLIT_DEPTH = 10
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_READ_TIMEOUT = 600
+    DISCOVER_CACHE_DIRECTORY_NAME = "dss-plugin-xmla-discover"
     HORIZONTAL_AXIS = 0
     MONDRIAN = "mondrian"
+    MULTIDIMENSIONAL = "Multidimensional"
     PLUGIN_VERSION = "0.0.1"
     POWER_BI = "power-bi"
+    RESULT_CACHE_DIRECTORY_NAME = "dss-plugin-xmla-cache"
+    # 500 is left out: SOAP faults come back as 500 and are not transient
+    RETRY_STATUS_CODES = (429, 502, 503, 504)
     SAP_BW = "sap-bw"
+    SESSION_POOL_IDLE_TIMEOUT = 300
+    SESSION_POOL_MAX_ENTRIES = 16
+    # lower case phrases of the faults raised by servers on result size limits and timeouts
+    SPLITTABLE_ERROR_MARKERS = (
+        # Mondrian: "Size of CrossJoin result (...) exceeded limit (...)", "Query timeout of 60 seconds reached"
+        "exceeded limit", "query timeout of",
+        # Analysis Services, Power BI
+        "memory error: allocation failure", "not enough memory to complete this operation",
+        "exceeded the maximum allowed size", "more memory than the configured limit",
+        "request timed out before it was completed",
+        # SAP BW
+        "result set too large", "size limit of result set exceeded", "tsv_tnew_page_alloc_failed"
+    )
+    TABULAR = "Tabular"
     VERTICAL_AXIS = 1
     XMLA_DEFAULT_VERSION = MONDRIAN
\ No newline at end of file
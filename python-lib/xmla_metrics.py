@@ -0,0 +1,104 @@
+import threading
+import time
+from safe_logger import SafeLogger
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is then not reported
+    resource = None
+
+
+logger = SafeLogger("xmla plugin", forbidden_keys=["password", "bearer_token"])
+
+
+def get_peak_memory_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)
+
+
+class XMLAMetrics(object):
+    """
+    Phase level timings and counters of a read, shared by every client
+    (and slice worker) taking part in it.
+
+    Times are in seconds:
+    - request_latency: from sending the request to receiving the response headers
+    - transfer_time: waiting for / reading response bytes
+    - parse_time: XML parsing, axis and cell decoding
+    - yield_time: time spent by the caller between two rows
+    """
+    def __init__(self, progress_interval=0):
+        self.progress_interval = progress_interval
+        self.lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        self.values = {}
+        self.start_time = time.time()
+        self.last_progress_time = self.start_time
+        self.rows = 0
+
+    def add(self, name, value=1):
+        with self.lock:
+            self.values[name] = self.values.get(name, 0) + value
+
+    def get(self, name):
+        return self.values.get(name, 0)
+
+    def row_emitted(self):
+        self.rows += 1
+        if self.progress_interval and self.rows % 1000 == 0:
+            now = time.time()
+            if now - self.last_progress_time >= self.progress_interval:
+                self.last_progress_time = now
+                logger.info("Progress: {}".format(self.get_progress()))
+
+    def get_progress(self):
+        elapsed = time.time() - self.start_time
+        return "{} rows in {:.1f}s ({:.0f} rows/s), {} bytes received".format(
+            self.rows, elapsed, self.rows / elapsed if elapsed else 0, self.get("bytes_received")
+        )
+
+    def get_summary(self):
+        elapsed = time.time() - self.start_time
+        summary = {
+            "elapsed_time": round(elapsed, 3),
+            "rows": self.rows,
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed else None,
+            "peak_memory_mb": get_peak_memory_mb()
+        }
+        with self.lock:
+            for name, value in self.values.items():
+                summary[name] = round(value, 3) if isinstance(value, float) else value
+        return summary
+
+    def log_summary(self):
+        logger.info("Read summary: {}".format(self.get_summary()))
+
+
+class MeteredStream(object):
+    """
+    File-like wrapper around a urllib3 response body, timing and counting reads.
+    """
+    def __init__(self, raw, metrics):
+        self.raw = raw
+        self.metrics = metrics
+        self.transfer_time = 0.0
+
+    def read(self, size=-1):
+        start = time.time()
+        data = self.raw.read(size)
+        self.transfer_time += time.time() - start
+        self.metrics.add("bytes_decoded", len(data))
+        return data
+
+    def get_bytes_received(self):
+        # bytes pulled from the wire, before any content decoding
+        tell = getattr(self.raw, "tell", None)
+        try:
+            return tell() if tell else None
+        except (IOError, OSError, ValueError):
+            return None
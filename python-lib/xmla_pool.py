@@ -0,0 +1,107 @@
+import base64
+import json
+import threading
+import time
+import requests
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from xmla_common import get_hashed_key
+from xmla_constants import XMLAConstants
+from xmla_auth import XMLAAuth
+
+
+def build_session(max_retries, pool_size=XMLAConstants.DEFAULT_POOL_SIZE):
+    """
+    Session retrying connection errors and transient statuses with exponential backoff.
+    POST is retried as well: the plugin only sends Discover requests and
+    SELECT statements, which are read-only.
+    Read timeouts are not retried: the query ran for the whole read timeout
+    already, and AdaptiveExecution splits it instead.
+    """
+    retry_settings = {
+        "total": max_retries,
+        "read": 0,
+        "backoff_factor": XMLAConstants.DEFAULT_BACKOFF_FACTOR,
+        "status_forcelist": XMLAConstants.RETRY_STATUS_CODES,
+        "raise_on_status": False
+    }
+    try:
+        retry = Retry(allowed_methods=frozenset(["POST"]), **retry_settings)
+    except TypeError:
+        # urllib3 < 1.26
+        retry = Retry(method_whitelist=frozenset(["POST"]), **retry_settings)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # XML compresses very well, let the server gzip it
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+def get_token_expiry(bearer_token):
+    # exp claim of a JWT access token, None for opaque tokens
+    try:
+        payload = bearer_token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload.encode("ascii")).decode("utf-8"))["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class SessionPool(object):
+    """
+    Process-wide pool of authenticated sessions, keyed by endpoint, auth type
+    and principal (the secrets are part of the hashed key, so a changed
+    password or a new token gets a new session).
+
+    Reusing a session keeps its keep-alive connections, and for NTLM and
+    Kerberos the connections already authenticated, for the pooled clients
+    created for the same endpoint and credentials within one Python process.
+    Nothing outlives the process: each dataset settings dropdown runs in a
+    new one. Sessions checked out idle_timeout seconds ago, or whose
+    bearer token has expired, are dropped from the pool; over max_entries,
+    the least recently checked out one is. Dropped sessions are not closed,
+    as clients may still be reading through them: their connections are
+    released once the last client holding them is gone.
+    """
+    def __init__(self, max_entries=XMLAConstants.SESSION_POOL_MAX_ENTRIES, idle_timeout=XMLAConstants.SESSION_POOL_IDLE_TIMEOUT):
+        self.max_entries = max_entries
+        self.idle_timeout = idle_timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_session(self, endpoint, auth_type=None, username=None, password=None, bearer_token=None,
+                    max_retries=XMLAConstants.DEFAULT_MAX_RETRIES):
+        key = get_hashed_key(endpoint, auth_type, username, password, bearer_token, max_retries)
+        now = time.time()
+        with self.lock:
+            self.remove_expired(now)
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                session = build_session(max_retries)
+                session.auth = XMLAAuth(auth_type, username, password, bearer_token)
+                token_expiry = get_token_expiry(bearer_token) if bearer_token else None
+            else:
+                _, token_expiry, session = entry
+            self.entries[key] = (now, token_expiry, session)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return session
+
+    def remove_expired(self, now):
+        for key, (last_used, token_expiry, _) in list(self.entries.items()):
+            if last_used + self.idle_timeout < now or (token_expiry and token_expiry < now):
+                del self.entries[key]
+
+    def clear(self):
+        # unlike expiry, closes the sessions: only for when no client is left
+        with self.lock:
+            for _, _, session in self.entries.values():
+                session.close()
+            self.entries.clear()
+
+
+# Shared by every pooled XMLAClient of the process
+session_pool = SessionPool()
@@ -0,0 +1,64 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("xmla plugin", forbidden_keys=["password", "bearer_token"])
+
+
+class SlicedExecution(object):
+    """
+    Runs a query as consecutive ROWS slices on a bounded pool of clients.
+
+    build_query(start, count) must return the MDX for the slice starting at
+    row `start`. Up to number_of_workers slices are in flight at once, each
+    worker thread owning its own XMLAClient (and therefore its own
+    requests.Session). Rows are yielded in slice order; the first slice
+    returning less than slice_size rows marks the end of the result.
+    """
+    def __init__(self, client_factory, number_of_workers, slice_size):
+        self.client_factory = client_factory
+        self.number_of_workers = max(1, number_of_workers)
+        self.slice_size = slice_size
+        self.local = threading.local()
+        self.clients = []
+        self.lock = threading.Lock()
+
+    def get_client(self):
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.client_factory()
+            self.local.client = client
+            with self.lock:
+                self.clients.append(client)
+        return client
+
+    def run_slice(self, build_query, start):
+        mdx_query = build_query(start, self.slice_size)
+        logger.info("Slice starting at row {}: mdx_query={}".format(start, mdx_query))
+        cube = self.get_client().execute_stream(mdx_query)
+        return list(cube.iter_rows())
+
+    def iter_rows(self, build_query):
+        executor = ThreadPoolExecutor(max_workers=self.number_of_workers)
+        futures = deque()
+        next_start = 0
+        try:
+            for _ in range(self.number_of_workers):
+                futures.append(executor.submit(self.run_slice, build_query, next_start))
+                next_start += self.slice_size
+            while futures:
+                rows = futures.popleft().result()
+                for row in rows:
+                    yield row
+                if len(rows) < self.slice_size:
+                    return
+                futures.append(executor.submit(self.run_slice, build_query, next_start))
+                next_start += self.slice_size
+        finally:
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=True)
+            for client in self.clients:
+                client.session.close()
@@ -0,0 +1,91 @@
+import requests
+from urllib3.exceptions import ReadTimeoutError
+from xmla_constants import XMLAConstants
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("xmla plugin", forbidden_keys=["password", "bearer_token"])
+
+
+def is_splittable_error(error):
+    """
+    True for read timeouts and for the faults servers raise when a result is too large.
+    Connect timeouts are not: a smaller query would not reach the server either.
+    """
+    if isinstance(error, (requests.exceptions.ReadTimeout, ReadTimeoutError)):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        # read timeouts are not retried, and reach requests as a ConnectionError
+        # wrapping the ReadTimeoutError, directly or in a MaxRetryError
+        reason = error.args[0] if error.args else None
+        if isinstance(getattr(reason, "reason", reason), ReadTimeoutError):
+            return True
+    message = "{}".format(error).lower()
+    return any(marker in message for marker in XMLAConstants.SPLITTABLE_ERROR_MARKERS)
+
+
+def format_members_set(members):
+    return "{{{}}}".format(", ".join(members))
+
+
+class AdaptiveExecution(object):
+    """
+    Runs a query and, when the server rejects it as too large or times out,
+    runs it again as two halves of the members of the outermost dimension,
+    recursively. Once the outermost dimension is down to a single member, the
+    next dimension is split. Rows of the sub-queries are streamed in order.
+
+    build_query(dimension_sets) must return the MDX of the query where the
+    ROWS sets of the dimensions found in dimension_sets are replaced.
+    """
+    def __init__(self, client, cube, dimensions, build_query, max_depth=XMLAConstants.DEFAULT_MAX_SPLIT_DEPTH):
+        self.client = client
+        self.cube = cube
+        self.dimensions = dimensions
+        self.build_query = build_query
+        self.max_depth = max_depth
+
+    def iter_rows(self, dimension_sets=None):
+        return self.iter_split_rows(dict(dimension_sets or {}), {}, 0)
+
+    def iter_split_rows(self, dimension_sets, member_lists, depth):
+        query_sets = dict(dimension_sets)
+        for dimension, members in member_lists.items():
+            query_sets[dimension] = format_members_set(members)
+        mdx_query = self.build_query(query_sets)
+        logger.info("mdx_query={}".format(mdx_query))
+        has_yielded = False
+        try:
+            for row in self.client.execute_stream(mdx_query).iter_rows():
+                has_yielded = True
+                yield row
+            return
+        except Exception as error:
+            # rows already sent cannot be taken back, so only failures before the first row are split
+            if has_yielded or depth >= self.max_depth or not is_splittable_error(error):
+                raise
+            sub_member_lists = self.split(dimension_sets, member_lists)
+            if not sub_member_lists:
+                raise
+            logger.warning("Query failed with '{}', splitting it in {} parts".format(error, len(sub_member_lists)))
+        for sub_member_list in sub_member_lists:
+            for row in self.iter_split_rows(dimension_sets, sub_member_list, depth + 1):
+                yield row
+
+    def split(self, dimension_sets, member_lists):
+        for dimension in self.dimensions:
+            members = member_lists.get(dimension)
+            if members is None:
+                members_set = dimension_sets.get(dimension, "{}.Children".format(dimension))
+                members = self.client.get_set_members(self.cube, members_set)
+            if len(members) > 1:
+                middle = len(members) // 2
+                halves = []
+                for half in [members[:middle], members[middle:]]:
+                    sub_member_lists = dict(member_lists)
+                    sub_member_lists[dimension] = half
+                    halves.append(sub_member_lists)
+                return halves
+            member_lists = dict(member_lists)
+            member_lists[dimension] = members
+        return None
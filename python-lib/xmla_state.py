@@ -0,0 +1,78 @@
+import json
+import os
+from xmla_common import get_level_dimension
+
+
+class WatermarkStore(object):
+    """
+    Last loaded member of an incremental dataset, one small JSON file per key.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def get_path(self, key):
+        return os.path.join(self.directory, "{}.json".format(key))
+
+    def get(self, key):
+        try:
+            with open(self.get_path(key)) as state_file:
+                return json.load(state_file).get("watermark")
+        except (IOError, OSError, ValueError):
+            return None
+
+    def set(self, key, watermark):
+        path = self.get_path(key)
+        temporary_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary_path, "w") as state_file:
+            json.dump({"watermark": watermark}, state_file)
+        os.replace(temporary_path, path)
+
+
+def get_incremental_dimension_sets(level_unique_name, watermark, bound=None):
+    """
+    dimension_sets reading the members of the incremental level: all of them
+    on the first run, then only the ones after the watermark. With bound,
+    members after it are left out.
+    """
+    if watermark:
+        members_set = "{{{}.NextMember:{}}}".format(watermark, bound or "NULL")
+    elif bound:
+        members_set = "{{{}.Members.Item(0):{}}}".format(level_unique_name, bound)
+    else:
+        members_set = "{}.Members".format(level_unique_name)
+    return {get_level_dimension(level_unique_name): members_set}
+
+
+class IncrementalRead(object):
+    """
+    One read of the members of level_unique_name after the watermark stored
+    under key.
+
+    fix_bound() queries the last member having data before the read, which
+    then stops at it, and commit() stores it as the new watermark once all
+    the rows are returned: members loaded during the read are left to the
+    next one.
+    """
+    def __init__(self, store, key, level_unique_name):
+        self.store = store
+        self.key = key
+        self.level_unique_name = level_unique_name
+        self.watermark = store.get(key)
+        self.bound = None
+
+    def get_dimension_sets(self):
+        return get_incremental_dimension_sets(self.level_unique_name, self.watermark, bound=self.bound)
+
+    def fix_bound(self, get_last_member):
+        """
+        get_last_member(members_set) returns the unique name of the last member of the set having data, or None.
+        Returns False when no member after the watermark has data.
+        """
+        members_set = list(get_incremental_dimension_sets(self.level_unique_name, self.watermark).values())[0]
+        self.bound = get_last_member(members_set)
+        return self.bound is not None
+
+    def commit(self):
+        if self.bound:
+            self.store.set(self.key, self.bound)
@@ -0,0 +1,520 @@
+import time
+from xml.etree import ElementTree
+from xmla_common import AxisTuples, combine_members, decode_column_name
+from xmla_constants import XMLAConstants
+from xmla_metrics import MeteredStream, XMLAMetrics
+from xmla_types import ValueConverter, get_converter, get_dss_type_from_xsd
+from safe_logger import SafeLogger
+
+
+logger = SafeLogger("xmla plugin", forbidden_keys=["password", "bearer_token"])
+
+
+AXIS_NAMES = {
+    "Axis0": XMLAConstants.HORIZONTAL_AXIS,
+    "Axis1": XMLAConstants.VERTICAL_AXIS
+}
+
+XSI_TYPE = "{http://www.w3.org/2001/XMLSchema-instance}type"
+
+# bytes fed to the parser at a time, each feed producing one batch of rows
+FEED_SIZE = 256 * 1024
+
+# for the readers stopping after the first tuples or cell
+HEADER_FEED_SIZE = 16 * 1024
+
+
+def local_name(tag):
+    # "{urn:schemas-microsoft-com:xml-analysis:mddataset}Tuple" -> "Tuple"
+    return tag.rsplit("}", 1)[-1]
+
+
+class LocalNames(dict):
+    """
+    tag -> local name, computed once per distinct tag.
+    Rowset column names are tags too, so the cache is reset when it grows too large.
+    """
+    MAX_SIZE = 10000
+
+    def __missing__(self, tag):
+        if len(self) >= self.MAX_SIZE:
+            self.clear()
+        name = self[tag] = local_name(tag)
+        return name
+
+
+# Shared by all the parsers of the process
+LOCAL_NAMES = LocalNames()
+
+
+def get_attribute(attrib, name):
+    # Attributes such as xsi:type are namespaced once parsed by ElementTree
+    for key, value in attrib.items():
+        if local_name(key) == name:
+            return value
+    return None
+
+
+def iter_feeds(stream, parser, feed_size=FEED_SIZE):
+    """
+    Feeds stream to parser by chunks of feed_size bytes, yielding after each
+    one whether the end of the stream was reached, so that the caller can drain
+    the parser target between chunks or stop reading.
+    """
+    while True:
+        chunk = stream.read(feed_size)
+        if not chunk:
+            parser.close()
+            yield True
+            return
+        parser.feed(chunk)
+        yield False
+
+
+def iter_metered_rows(rows, stream, metrics):
+    """
+    Passes rows through, splitting the time of the read between transfer,
+    parsing / decoding and the caller's own processing of each row.
+    """
+    start = time.time()
+    yield_time = 0.0
+    try:
+        for row in rows:
+            yield_start = time.time()
+            yield row
+            yield_time += time.time() - yield_start
+    finally:
+        rows.close()
+        elapsed = time.time() - start
+        metrics.add("transfer_time", stream.transfer_time)
+        metrics.add("parse_time", max(0.0, elapsed - yield_time - stream.transfer_time))
+        metrics.add("yield_time", yield_time)
+        bytes_received = stream.get_bytes_received()
+        if bytes_received is not None:
+            metrics.add("bytes_received", bytes_received)
+
+
+def get_fault_description(fault):
+    fault_string = None
+    for element in fault.iter():
+        tag = local_name(element.tag)
+        if tag == "Error" and element.get("Description"):
+            return element.get("Description")
+        if tag == "faultstring":
+            fault_string = element.text
+    return fault_string
+
+
+def get_response_fault(content):
+    try:
+        root = ElementTree.fromstring(content)
+    except ElementTree.ParseError:
+        return None
+    for element in root.iter():
+        if local_name(element.tag) == "Fault":
+            return get_fault_description(element)
+    return None
+
+
+class ResponseTarget(object):
+    """
+    Base of the XMLParser targets: the response is decoded from the parser
+    callbacks, without building any element. Text is only gathered while
+    self.text is not None. A SOAP fault raises an exception.
+    """
+    def __init__(self):
+        self.local_names = LOCAL_NAMES
+        self.text = None
+        self.fault = None
+
+    def data(self, data):
+        if self.text is not None:
+            self.text += data
+
+    def fault_start(self, name, attrib):
+        if name == "Fault":
+            self.fault = {}
+        elif self.fault is not None:
+            if name == "Error" and attrib.get("Description"):
+                self.fault.setdefault("Error", attrib.get("Description"))
+            elif name == "faultstring":
+                self.text = ""
+
+    def fault_end(self, name):
+        if self.fault is None:
+            return
+        if name == "faultstring":
+            self.fault.setdefault("faultstring", self.text)
+            self.text = None
+        elif name == "Fault":
+            raise Exception("Error: {}".format(self.fault.get("Error") or self.fault.get("faultstring")))
+
+    def close(self):
+        return None
+
+
+class ExecuteResponseTarget(ResponseTarget):
+    """
+    Decodes a Multidimensional Execute response: row axis tuples go straight
+    into rows_axis, column axis tuples into columns_names (and their members
+    into columns_axis when given) and cells, as [ordinal, text, xsi:type],
+    into the cells buffer, which the caller drains after each feed.
+    """
+    def __init__(self, rows_axis, columns_axis=None):
+        ResponseTarget.__init__(self)
+        self.rows_axis = rows_axis
+        self.columns_axis = columns_axis
+        self.columns_names = []
+        self.cells = []
+        self.axis_index = None
+        self.members = None
+        self.member = None
+        self.cell = None
+
+    def start(self, tag, attrib):
+        name = self.local_names[tag]
+        if self.member is not None:
+            self.text = ""
+        elif name == "Cell":
+            self.cell = [int(attrib.get("CellOrdinal", -1)), None, None]
+        elif name == "Value" and self.cell is not None:
+            self.cell[2] = attrib.get(XSI_TYPE) or get_attribute(attrib, "type")
+            self.text = ""
+        elif name == "Member" and self.members is not None:
+            self.member = {"@Hierarchy": attrib.get("Hierarchy", "")}
+        elif name == "Tuple":
+            self.members = []
+        elif name == "Axis":
+            self.axis_index = AXIS_NAMES.get(attrib.get("name"))
+        else:
+            self.fault_start(name, attrib)
+
+    def end(self, tag):
+        name = self.local_names[tag]
+        if self.member is not None:
+            if name == "Member":
+                self.members.append(self.member)
+                self.member = None
+            else:
+                self.member[name] = self.text or None
+                self.text = None
+        elif name == "Value":
+            if self.cell is not None:
+                self.cell[1] = self.text or None
+            self.text = None
+        elif name == "Cell":
+            self.cells.append(self.cell)
+            self.cell = None
+        elif name == "Tuple":
+            if self.axis_index == XMLAConstants.HORIZONTAL_AXIS:
+                self.columns_names.append(combine_members(self.members))
+                if self.columns_axis is not None:
+                    self.columns_axis.append(self.members)
+            elif self.axis_index == XMLAConstants.VERTICAL_AXIS:
+                self.rows_axis.append(self.members)
+            self.members = None
+        elif name == "Axis":
+            self.axis_index = None
+        else:
+            self.fault_end(name)
+
+
+class RowsetResponseTarget(ResponseTarget):
+    """
+    Decodes a Tabular (rowset) Execute response: columns declared by the
+    inline schema go into columns_names, and each <row> into the rows buffer
+    as a list of converted values, which the caller drains after each feed.
+    Columns missing from the schema are appended when first seen.
+    """
+    def __init__(self):
+        ResponseTarget.__init__(self)
+        self.columns_names = []
+        self.columns_types = []
+        self.converters = []
+        self.indexes = {}
+        self.rows = []
+        self.in_row_type = False
+        self.values = None
+        self.index = None
+        self.widened = False
+
+    def add_column(self, name, xsd_type):
+        self.indexes[name] = len(self.columns_names)
+        self.columns_names.append(decode_column_name(name))
+        self.columns_types.append(xsd_type)
+        self.converters.append(get_converter(xsd_type))
+
+    def start(self, tag, attrib):
+        name = self.local_names[tag]
+        if self.values is not None:
+            index = self.indexes.get(name)
+            if index is None:
+                self.add_column(name, None)
+                self.values.append(None)
+                self.widened = True
+                index = self.indexes[name]
+            self.index = index
+            self.text = ""
+        elif name == "row":
+            self.values = [None] * len(self.columns_names)
+        elif name == "complexType":
+            # the inline xsd:schema declares the rowset columns in <xsd:complexType name="row">
+            self.in_row_type = attrib.get("name") == "row"
+        elif name == "element" and self.in_row_type:
+            self.add_column(attrib.get("name", ""), attrib.get("type"))
+        else:
+            self.fault_start(name, attrib)
+
+    def end(self, tag):
+        name = self.local_names[tag]
+        if self.index is not None:
+            value = self.text
+            converter = self.converters[self.index]
+            if converter and value:
+                try:
+                    value = converter(value)
+                except ValueError:
+                    pass
+            self.values[self.index] = value
+            self.index = None
+            self.text = None
+        elif name == "row" and self.values is not None:
+            self.rows.append(self.values)
+            self.values = None
+        elif name == "complexType":
+            self.in_row_type = False
+        else:
+            self.fault_end(name)
+
+
+class RowBatch(object):
+    """
+    Consecutive rows of a result, column by column: the row axis (captions,
+    then member properties) as member indexes into the per hierarchy
+    dictionaries of rows_axis, then one list of values per column of the
+    column axis. Tabular results have no
+    rows_axis, all their columns are value columns.
+    """
+    __slots__ = ("rows_axis", "columns_names", "start", "length", "columns")
+
+    def __init__(self, rows_axis, columns_names, start, length, columns):
+        self.rows_axis = rows_axis
+        self.columns_names = columns_names
+        self.start = start
+        self.length = length
+        self.columns = columns
+
+    def get_names(self):
+        if self.rows_axis is None:
+            return self.columns_names
+        return self.rows_axis.get_columns_names() + self.columns_names
+
+    def get_dimension_columns(self):
+        if self.rows_axis is None:
+            return []
+        return self.rows_axis.get_columns(self.start, self.start + self.length)
+
+    def iter_dicts(self):
+        names = self.get_names()
+        for values in zip(*(self.get_dimension_columns() + self.columns)):
+            yield dict(zip(names, values))
+
+
+class StreamedCube(object):
+    """
+    properties are the DIMENSION PROPERTIES of the ROWS axis, output as
+    columns after the row hierarchies.
+    """
+    def __init__(self, response, metrics=None, properties=None):
+        self.response = response
+        self.metrics = metrics or XMLAMetrics()
+        self.properties = properties or []
+
+    def read_header(self):
+        """
+        Reads the response only up to the first row tuple and closes it.
+        Returns the row axis hierarchies and the (column name, member unique name)
+        of each column tuple.
+        """
+        rows_axis, columns_axis = [], []
+        target = ExecuteResponseTarget(rows_axis, columns_axis=columns_axis)
+        parser = ElementTree.XMLParser(target=target)
+        try:
+            for _ in iter_feeds(self.response.raw, parser, HEADER_FEED_SIZE):
+                if rows_axis or target.cells:
+                    break
+        finally:
+            self.response.close()
+        columns = [
+            (combine_members(members), members[-1].get("UName") if members else None)
+            for members in columns_axis
+        ]
+        left_columns_names = []
+        if rows_axis:
+            left_columns_names = [member.get("@Hierarchy", "") for member in rows_axis[0]] + list(self.properties)
+        return left_columns_names, columns
+
+    def iter_tuples(self, axis_index):
+        """
+        Yields the members of each tuple of an axis, as dicts keyed like the
+        xmltodict ones, and stops reading at the first cell.
+        """
+        rows_axis, columns_axis = [], []
+        target = ExecuteResponseTarget(rows_axis, columns_axis=columns_axis)
+        parser = ElementTree.XMLParser(target=target)
+        tuples = columns_axis if axis_index == XMLAConstants.HORIZONTAL_AXIS else rows_axis
+        try:
+            for _ in iter_feeds(self.response.raw, parser, HEADER_FEED_SIZE):
+                for members in tuples:
+                    yield members
+                del tuples[:]
+                if target.cells:
+                    break
+        finally:
+            self.response.close()
+
+    def read_first_tuple(self, axis_index):
+        tuples = self.iter_tuples(axis_index)
+        try:
+            return next(tuples, None)
+        finally:
+            tuples.close()
+
+    def read_first_cell(self):
+        target = ExecuteResponseTarget([])
+        parser = ElementTree.XMLParser(target=target)
+        try:
+            for _ in iter_feeds(self.response.raw, parser, HEADER_FEED_SIZE):
+                if target.cells:
+                    return target.cells[0][1]
+        finally:
+            self.response.close()
+        return None
+
+    def iter_rows(self):
+        stream = MeteredStream(self.response.raw, self.metrics)
+        return iter_metered_rows(self.iter_decoded_rows(stream), stream, self.metrics)
+
+    def iter_decoded_rows(self, stream):
+        for batch in self.iter_batches(stream):
+            for row in batch.iter_dicts():
+                yield row
+
+    def iter_batches(self, stream):
+        """
+        Yields the rows as RowBatch, one per chunk of the response.
+        Cells are placed by their CellOrdinal (row = ordinal // number of columns),
+        so sparse responses omitting empty cells are assembled correctly:
+        missing cells are left to None and rows without any cell are still emitted.
+        The last row having cells in a chunk is held back, as the next chunk may
+        hold more of its cells.
+        """
+        rows_axis = AxisTuples(self.properties)
+        target = ExecuteResponseTarget(rows_axis)
+        parser = ElementTree.XMLParser(target=target)
+        value_converter = ValueConverter()
+        pending_cells = []
+        next_row_index = 0
+        counter = 0
+        try:
+            for is_last in iter_feeds(stream, parser):
+                if target.cells:
+                    for cell in target.cells:
+                        if cell[0] < 0:
+                            cell[0] = counter
+                        counter += 1
+                    cells = pending_cells + target.cells
+                    target.cells = []
+                else:
+                    cells = pending_cells
+                number_of_columns = len(target.columns_names)
+                if is_last:
+                    end_row_index = len(rows_axis)
+                    pending_cells = []
+                elif cells and number_of_columns:
+                    end_row_index = min(cells[-1][0] // number_of_columns, len(rows_axis))
+                    limit = end_row_index * number_of_columns
+                    split = len(cells)
+                    while split and cells[split - 1][0] >= limit:
+                        split -= 1
+                    cells, pending_cells = cells[:split], cells[split:]
+                else:
+                    pending_cells = cells
+                    continue
+                if end_row_index > next_row_index:
+                    yield self.build_batch(
+                        rows_axis, target.columns_names, next_row_index, end_row_index, cells, value_converter
+                    )
+                    next_row_index = end_row_index
+        finally:
+            self.response.close()
+            self.metrics.add("tuples_decoded", len(rows_axis) + len(target.columns_names))
+            self.metrics.add("cells_decoded", counter)
+
+    def build_batch(self, rows_axis, columns_names, start, end, cells, value_converter):
+        number_of_columns = len(columns_names)
+        columns = [[None] * (end - start) for _ in range(number_of_columns)]
+        convert = value_converter.convert
+        for cell_ordinal, value, value_type in cells:
+            row_index, column_index = divmod(cell_ordinal, number_of_columns)
+            if start <= row_index < end:
+                columns[column_index][row_index - start] = convert(value, value_type)
+        return RowBatch(rows_axis, columns_names, start, end - start, columns)
+
+
+class StreamedRowset(object):
+    """
+    Rows of a Tabular (rowset) Execute response. Each <row> element maps
+    straight to one output record, so no axis / cell join is needed.
+    """
+    def __init__(self, response, metrics=None):
+        self.response = response
+        self.metrics = metrics or XMLAMetrics()
+
+    def read_header(self):
+        """
+        Reads the response only up to its first rows and closes it.
+        Returns the (column name, DSS type) of each column.
+        """
+        target = RowsetResponseTarget()
+        parser = ElementTree.XMLParser(target=target)
+        try:
+            for _ in iter_feeds(self.response.raw, parser, HEADER_FEED_SIZE):
+                if target.rows:
+                    break
+        finally:
+            self.response.close()
+        return [
+            (name, get_dss_type_from_xsd(xsd_type) or "string")
+            for name, xsd_type in zip(target.columns_names, target.columns_types)
+        ]
+
+    def iter_rows(self):
+        stream = MeteredStream(self.response.raw, self.metrics)
+        return iter_metered_rows(self.iter_decoded_rows(stream), stream, self.metrics)
+
+    def iter_decoded_rows(self, stream):
+        for batch in self.iter_batches(stream):
+            for row in batch.iter_dicts():
+                yield row
+
+    def iter_batches(self, stream):
+        """
+        Yields the rows as RowBatch, one per chunk of the response.
+        """
+        target = RowsetResponseTarget()
+        parser = ElementTree.XMLParser(target=target)
+        number_of_rows = 0
+        try:
+            for _ in iter_feeds(stream, parser):
+                rows, target.rows = target.rows, []
+                if rows:
+                    number_of_columns = len(target.columns_names)
+                    if target.widened:
+                        rows = [values + [None] * (number_of_columns - len(values)) for values in rows]
+                    columns = list(zip(*rows)) if number_of_columns else []
+                    yield RowBatch(None, list(target.columns_names), number_of_rows, len(rows), columns)
+                    number_of_rows += len(rows)
+        finally:
+            self.response.close()
+            self.metrics.add("cells_decoded", number_of_rows * len(target.columns_names))
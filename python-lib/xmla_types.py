@@ -0,0 +1,97 @@
+DSS_TYPES_BY_OLEDB_TYPE = {
+    # DATA_TYPE column of MDSCHEMA_MEASURES, as OLE DB DBTYPE codes
+    2: "int",
+    3: "int",
+    4: "float",
+    5: "double",
+    6: "double",
+    7: "date",
+    11: "boolean",
+    14: "double",
+    16: "int",
+    17: "int",
+    18: "int",
+    19: "bigint",
+    20: "bigint",
+    21: "bigint",
+    130: "string",
+    131: "double",
+    133: "date",
+    135: "date"
+}
+
+DSS_TYPES_BY_XSD_TYPE = {
+    "boolean": "boolean",
+    "byte": "int",
+    "date": "date",
+    "dateTime": "date",
+    "decimal": "double",
+    "double": "double",
+    "float": "float",
+    "int": "int",
+    "integer": "bigint",
+    "long": "bigint",
+    "short": "int",
+    "string": "string",
+    "unsignedByte": "int",
+    "unsignedInt": "bigint",
+    "unsignedLong": "bigint",
+    "unsignedShort": "int"
+}
+
+
+def convert_boolean(value):
+    return value.lower() == "true"
+
+
+CONVERTERS_BY_DSS_TYPE = {
+    "bigint": int,
+    "boolean": convert_boolean,
+    "double": float,
+    "float": float,
+    "int": int
+}
+
+
+def get_dss_type_from_oledb(data_type):
+    try:
+        return DSS_TYPES_BY_OLEDB_TYPE.get(int(data_type), "string")
+    except (TypeError, ValueError):
+        return "string"
+
+
+def get_dss_type_from_xsd(xsd_type):
+    # "xsd:double" -> "double"
+    if not xsd_type:
+        return None
+    return DSS_TYPES_BY_XSD_TYPE.get(xsd_type.rsplit(":", 1)[-1])
+
+
+def get_converter(xsd_type):
+    """
+    Returns the function converting the text of a value of this xsi:type,
+    or None when the text can be kept as is (strings, dates).
+    """
+    return CONVERTERS_BY_DSS_TYPE.get(get_dss_type_from_xsd(xsd_type))
+
+
+class ValueConverter(object):
+    """
+    Converts cell texts following their xsi:type. Converters are resolved
+    once per distinct type instead of once per cell.
+    """
+    def __init__(self):
+        self.converters = {}
+
+    def convert(self, value, xsd_type):
+        if value is None or xsd_type is None:
+            return value
+        if xsd_type not in self.converters:
+            self.converters[xsd_type] = get_converter(xsd_type)
+        converter = self.converters[xsd_type]
+        if converter is None:
+            return value
+        try:
+            return converter(value)
+        except ValueError:
+            return value
@@ -1,7 +1,4 @@
-import json
-import requests
-import xmltodict
-from xmla_common import get_credentials
+from xmla_common import get_credentials, get_auth_type
 from xmla_client import XMLAClient
 from safe_logger import SafeLogger
 
@@ -40,7 +37,8 @@ def do(payload, config, plugin_config, inputs):
         version=mdx_version,
         username=username,
         password=password,
-        bearer_token=bearer_token
+        bearer_token=bearer_token,
+        auth_type=get_auth_type(config)
     )
     choices = Choices()
 
@@ -53,7 +51,7 @@ def do(payload, config, plugin_config, inputs):
     if parameter_name == "select_schema_cube":
         if not select_catalog:
             return build_select_choices("Select a catalog")
-        cubes = client.discover("MDSCHEMA_CUBES")
+        cubes = client.discover("MDSCHEMA_CUBES", restrictions={"CATALOG_NAME": select_catalog})
         for cube in cubes:
             if cube.get("CATALOG_NAME") == select_catalog:
                 choices.append(cube.get("CUBE_NAME"), cube.get("CUBE_NAME"))
@@ -64,7 +62,10 @@ def do(payload, config, plugin_config, inputs):
             return build_select_choices("Select a catalog")
         if not select_schema_cube:
             return build_select_choices("Select a cube")
-        dimensions = client.discover("MDSCHEMA_DIMENSIONS")
+        dimensions = client.discover(
+            "MDSCHEMA_DIMENSIONS",
+            restrictions={"CATALOG_NAME": select_catalog, "CUBE_NAME": select_schema_cube}
+        )
         for dimension in dimensions:
             if dimension.get("CATALOG_NAME") == select_catalog and dimension.get("CUBE_NAME") == select_schema_cube:
                 choices.append(dimension.get("DIMENSION_NAME"), dimension.get("DIMENSION_UNIQUE_NAME"))
@@ -75,7 +76,10 @@ def do(payload, config, plugin_config, inputs):
             return build_select_choices("Select a catalog")
         if not select_schema_cube:
             return build_select_choices("Select a cube")
-        measures = client.discover("MDSCHEMA_MEASURES")
+        measures = client.discover(
+            "MDSCHEMA_MEASURES",
+            restrictions={"CATALOG_NAME": select_catalog, "CUBE_NAME": select_schema_cube}
+        )
         for measure in measures:
             if measure.get("CATALOG_NAME") == select_catalog and measure.get("CUBE_NAME") == select_schema_cube:
                 choices.append(measure.get("MEASURE_NAME"), measure.get("MEASURE_UNIQUE_NAME"))
@@ -93,16 +97,40 @@ def do(payload, config, plugin_config, inputs):
         #     choices.append(hierarchy.get("HIERARCHY_NAME"), hierarchy.get("HIERARCHY_UNIQUE_NAME"))
         # return choices.to_dss()
 
+    if parameter_name in ["select_partitioning_level", "select_incremental_level"]:
+        if not select_catalog:
+            return build_select_choices("Select a catalog")
+        if not select_schema_cube:
+            return build_select_choices("Select a cube")
+        levels = client.discover(
+            "MDSCHEMA_LEVELS",
+            restrictions={"CATALOG_NAME": select_catalog, "CUBE_NAME": select_schema_cube}
+        )
+        choices.append(DEFAULT_EMPTY_CHOICE.get("label"), DEFAULT_EMPTY_CHOICE.get("value"))
+        for level in levels:
+            if level.get("DIMENSION_UNIQUE_NAME") == "[Measures]":
+                continue
+            choices.append(level.get("LEVEL_UNIQUE_NAME"), level.get("LEVEL_UNIQUE_NAME"))
+        return choices.to_dss()
+
     if parameter_name == "select_properties":
         if not select_catalog:
             return build_select_choices("Select a catalog")
         if not select_schema_cube:
             return build_select_choices("Select a cube")
-        properties = client.discover("MDSCHEMA_PROPERTIES")
+        properties = client.discover(
+            "MDSCHEMA_PROPERTIES",
+            restrictions={"CATALOG_NAME": select_catalog, "CUBE_NAME": select_schema_cube}
+        )
         for property in properties:
             if property.get("CATALOG_NAME") == select_catalog and property.get("CUBE_NAME") == select_schema_cube and property.get("DIMENSION_UNIQUE_NAME") in select_dimensions:
                 property_tag = "{}.{}".format(property.get("DIMENSION_UNIQUE_NAME"), property.get("PROPERTY_NAME"))
-                choices.append(property_tag, property_tag)
+                # level qualified names are the form every server accepts in DIMENSION PROPERTIES
+                property_unique_name = "{}.[{}]".format(
+                    property.get("LEVEL_UNIQUE_NAME") or property.get("DIMENSION_UNIQUE_NAME"),
+                    property.get("PROPERTY_NAME")
+                )
+                choices.append(property_tag, property_unique_name)
         return choices.to_dss()
     return build_select_choices()
 
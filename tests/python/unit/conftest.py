@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the plugin modules are loaded from python-lib by DSS
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "python-lib"))
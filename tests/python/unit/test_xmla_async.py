@@ -0,0 +1,49 @@
+import threading
+from xmla_async import AsyncXMLAClient, run_coroutine
+
+
+class FakeSession(object):
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeClient(object):
+    """
+    Discover calls wait for each other, so they only return when they run at once.
+    """
+    def __init__(self, barrier):
+        self.barrier = barrier
+        self.session = FakeSession()
+        self.thread = None
+
+    def discover(self, function_name, restrictions=None, use_cache=True):
+        self.thread = threading.current_thread()
+        self.barrier.wait(timeout=5)
+        return [{"function_name": function_name, "client": self}]
+
+
+def test_calls_run_at_once_each_worker_on_its_own_client():
+    barrier = threading.Barrier(2)
+    clients = []
+
+    def client_factory():
+        clients.append(FakeClient(barrier))
+        return clients[-1]
+
+    async_client = AsyncXMLAClient(client_factory, max_concurrency=2)
+    try:
+        dimensions, measures = run_coroutine(async_client.gather(
+            async_client.discover("MDSCHEMA_DIMENSIONS"),
+            async_client.discover("MDSCHEMA_MEASURES")
+        ))
+    finally:
+        async_client.close()
+    assert dimensions[0]["function_name"] == "MDSCHEMA_DIMENSIONS"
+    assert measures[0]["function_name"] == "MDSCHEMA_MEASURES"
+    assert dimensions[0]["client"] is not measures[0]["client"]
+    assert len(clients) == 2
+    assert clients[0].thread is not clients[1].thread
+    assert all(client.session.closed for client in clients)
@@ -0,0 +1,77 @@
+import gzip
+import json
+import os
+import time
+from xmla_cache import DiscoverCache, ResultCache
+
+
+def list_entries(directory):
+    return sorted(file_name for file_name in os.listdir(directory) if file_name.endswith(".json"))
+
+
+def test_discover_cache_caps_the_directory(tmp_path):
+    cache = DiscoverCache(max_entries=2, ttl=300, directory=str(tmp_path))
+    for index in range(10):
+        cache.set("key{}".format(index), [{"CUBE_NAME": "Sales"}])
+        # distinct modification times, so that the oldest entries are removed first
+        modified = time.time() - 100 + index
+        os.utime(os.path.join(str(tmp_path), "key{}.json".format(index)), (modified, modified))
+    assert list_entries(str(tmp_path)) == ["key8.json", "key9.json"]
+
+
+def test_discover_cache_removes_expired_entries(tmp_path):
+    cache = DiscoverCache(max_entries=10, ttl=300, directory=str(tmp_path))
+    cache.set("old", [{"CUBE_NAME": "Sales"}])
+    path = os.path.join(str(tmp_path), "old.json")
+    with open(path, "w") as cache_file:
+        json.dump({"created": time.time() - 600, "value": [{"CUBE_NAME": "Sales"}]}, cache_file)
+    os.utime(path, (time.time() - 600, time.time() - 600))
+
+    # another process only has the disk layer
+    assert DiscoverCache(max_entries=10, ttl=300, directory=str(tmp_path)).get("old") is None
+    assert list_entries(str(tmp_path)) == []
+
+    cache.set("expired", [])
+    os.utime(os.path.join(str(tmp_path), "expired.json"), (time.time() - 600, time.time() - 600))
+    cache.set("new", [{"CUBE_NAME": "Sales"}])
+    assert list_entries(str(tmp_path)) == ["new.json"]
+    assert DiscoverCache(directory=str(tmp_path)).get("new") == [{"CUBE_NAME": "Sales"}]
+
+
+def store_and_read(cache, rows):
+    stored_rows = list(cache.iter_and_store("key", iter(rows)))
+    assert stored_rows == rows
+    cached_rows = cache.get("key")
+    assert cached_rows is not None
+    return list(cached_rows)
+
+
+def test_result_cache_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.BLOCK_SIZE = 2
+    rows = [{"Time": str(year), "Unit Sales": float(year), "Store Cost": None} for year in range(1990, 1995)]
+    assert store_and_read(cache, rows) == rows
+    assert store_and_read(cache, []) == []
+
+
+def test_result_cache_keeps_columns_added_mid_stream(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.BLOCK_SIZE = 2
+    # a widened rowset, then rows of batch targets keeping different measures
+    rows = [
+        {"Time": "1997", "Unit Sales": 1.0},
+        {"Time": "1998", "Unit Sales": 2.0, "Store Cost": 3.0},
+        {"Time": "1999", "Unit Sales": 4.0, "Store Cost": None},
+        {"Time": "1997", "Store Cost": 5.0, "xmla_source": "North/Sales"},
+        {"Time": "1997", "Unit Sales": 6.0, "xmla_source": "South/Sales"},
+        {"Time": "1998", "Store Cost": 7.0, "xmla_source": "North/Sales"}
+    ]
+    assert store_and_read(cache, rows) == rows
+
+
+def test_result_cache_reads_entries_without_block_columns(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    with gzip.open(cache.get_path("key"), "wt") as cache_file:
+        cache_file.write(json.dumps({"created": time.time(), "columns": ["Time", "Unit Sales"]}) + "\n")
+        cache_file.write(json.dumps({"values": [["1997", "1998"], [1.0, 2.0]]}) + "\n")
+    assert list(cache.get("key")) == [{"Time": "1997", "Unit Sales": 1.0}, {"Time": "1998", "Unit Sales": 2.0}]
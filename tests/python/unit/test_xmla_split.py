@@ -0,0 +1,95 @@
+import pytest
+import requests
+from xmla_split import AdaptiveExecution, is_splittable_error
+
+
+SIZE_FAULT = "Error: Mondrian Error:Size of CrossJoin result (200000) exceeded limit (100000)"
+
+
+class FakeStream(object):
+    def __init__(self, rows, error):
+        self.rows = rows
+        self.error = error
+
+    def iter_rows(self):
+        for row in self.rows:
+            yield row
+        if self.error:
+            raise self.error
+
+
+class FakeClient(object):
+    """
+    Queries are the dimension_sets given to build_query. A query fails with
+    SIZE_FAULT when it reads more than max_members members of [Time] times
+    members of [Store], after returning rows_before_fault rows.
+    """
+    def __init__(self, members, max_members=1, rows_before_fault=0):
+        self.members = members
+        self.max_members = max_members
+        self.rows_before_fault = rows_before_fault
+        self.queries = []
+
+    def get_set_members(self, cube, members_set):
+        return self.members[members_set.split(".")[0]]
+
+    def get_query_members(self, query_sets, dimension):
+        members_set = query_sets.get(dimension, "")
+        if members_set.startswith("{"):
+            return members_set.strip("{}").split(", ")
+        return self.members[dimension]
+
+    def execute_stream(self, query_sets):
+        self.queries.append(query_sets)
+        time_members = self.get_query_members(query_sets, "[Time]")
+        store_members = self.get_query_members(query_sets, "[Store]")
+        rows = [{"Time": time, "Store": store} for time in time_members for store in store_members]
+        if len(rows) > self.max_members:
+            return FakeStream(rows[:self.rows_before_fault], Exception(SIZE_FAULT))
+        return FakeStream(rows, None)
+
+
+def read_rows(client, dimensions=("[Time]", "[Store]"), max_depth=10):
+    adaptive_execution = AdaptiveExecution(client, "Sales", list(dimensions), lambda query_sets: query_sets, max_depth=max_depth)
+    return list(adaptive_execution.iter_rows())
+
+
+def test_split_halves_the_outermost_dimension_first():
+    client = FakeClient({"[Time]": ["[Time].[1997]", "[Time].[1998]", "[Time].[1999]"], "[Store]": ["[Store].[USA]"]})
+    rows = read_rows(client)
+    assert [row["Time"] for row in rows] == ["[Time].[1997]", "[Time].[1998]", "[Time].[1999]"]
+    assert client.queries[1] == {"[Time]": "{[Time].[1997]}"}
+    assert client.queries[2] == {"[Time]": "{[Time].[1998], [Time].[1999]}"}
+
+
+def test_split_moves_on_to_the_next_dimension():
+    client = FakeClient({"[Time]": ["[Time].[1997]"], "[Store]": ["[Store].[USA]", "[Store].[Canada]"]})
+    rows = read_rows(client)
+    assert rows == [
+        {"Time": "[Time].[1997]", "Store": "[Store].[USA]"},
+        {"Time": "[Time].[1997]", "Store": "[Store].[Canada]"}
+    ]
+    assert client.queries[1] == {"[Time]": "{[Time].[1997]}", "[Store]": "{[Store].[USA]}"}
+
+
+def test_no_split_once_rows_were_returned():
+    client = FakeClient({"[Time]": ["[Time].[1997]", "[Time].[1998]"], "[Store]": ["[Store].[USA]"]}, rows_before_fault=1)
+    with pytest.raises(Exception, match="exceeded limit"):
+        read_rows(client)
+    assert len(client.queries) == 1
+
+
+def test_no_split_past_max_depth_or_single_members():
+    client = FakeClient({"[Time]": ["[Time].[{}]".format(year) for year in range(1990, 1998)], "[Store]": ["[Store].[USA]"]})
+    with pytest.raises(Exception, match="exceeded limit"):
+        read_rows(client, max_depth=1)
+    client = FakeClient({"[Time]": ["[Time].[1997]"], "[Store]": ["[Store].[USA]"]}, max_members=0)
+    with pytest.raises(Exception, match="exceeded limit"):
+        read_rows(client)
+
+
+def test_is_splittable_error():
+    assert is_splittable_error(Exception(SIZE_FAULT))
+    assert is_splittable_error(requests.exceptions.ReadTimeout())
+    assert not is_splittable_error(requests.exceptions.ConnectTimeout())
+    assert not is_splittable_error(Exception("Error: Invalid member [Measures].[Memory Limit]"))
@@ -0,0 +1,52 @@
+from xmla_state import IncrementalRead, WatermarkStore, get_incremental_dimension_sets
+
+
+LEVEL = "[Time].[Month]"
+
+
+def test_get_incremental_dimension_sets():
+    assert get_incremental_dimension_sets(LEVEL, None) == {"[Time]": "[Time].[Month].Members"}
+    assert get_incremental_dimension_sets(LEVEL, None, bound="[Time].[1997].[Q1].[3]") == {
+        "[Time]": "{[Time].[Month].Members.Item(0):[Time].[1997].[Q1].[3]}"
+    }
+    assert get_incremental_dimension_sets(LEVEL, "[Time].[1997].[Q1].[3]") == {
+        "[Time]": "{[Time].[1997].[Q1].[3].NextMember:NULL}"
+    }
+    assert get_incremental_dimension_sets(LEVEL, "[Time].[1997].[Q1].[3]", bound="[Time].[1997].[Q2].[5]") == {
+        "[Time]": "{[Time].[1997].[Q1].[3].NextMember:[Time].[1997].[Q2].[5]}"
+    }
+
+
+def test_incremental_reads_move_the_watermark_to_the_bound(tmp_path):
+    store = WatermarkStore(str(tmp_path))
+    queried_sets = []
+    last_members = ["[Time].[1997].[Q1].[3]", "[Time].[1997].[Q2].[5]", None]
+
+    def get_last_member(members_set):
+        queried_sets.append(members_set)
+        return last_members[len(queried_sets) - 1]
+
+    first_read = IncrementalRead(store, "key", LEVEL)
+    assert first_read.fix_bound(get_last_member)
+    assert first_read.get_dimension_sets() == {"[Time]": "{[Time].[Month].Members.Item(0):[Time].[1997].[Q1].[3]}"}
+    # not committed yet: a failed read is read again in full
+    assert IncrementalRead(store, "key", LEVEL).watermark is None
+    first_read.commit()
+
+    second_read = IncrementalRead(store, "key", LEVEL)
+    assert second_read.watermark == "[Time].[1997].[Q1].[3]"
+    assert second_read.fix_bound(get_last_member)
+    assert second_read.get_dimension_sets() == {
+        "[Time]": "{[Time].[1997].[Q1].[3].NextMember:[Time].[1997].[Q2].[5]}"
+    }
+    second_read.commit()
+
+    third_read = IncrementalRead(store, "key", LEVEL)
+    assert not third_read.fix_bound(get_last_member)
+    third_read.commit()
+    assert IncrementalRead(store, "key", LEVEL).watermark == "[Time].[1997].[Q2].[5]"
+    assert queried_sets == [
+        "[Time].[Month].Members",
+        "{[Time].[1997].[Q1].[3].NextMember:NULL}",
+        "{[Time].[1997].[Q2].[5].NextMember:NULL}"
+    ]
@@ -0,0 +1,168 @@
+import io
+import os
+import pytest
+from xmla_stream import StreamedCube, StreamedRowset
+
+
+FIXTURES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+MULTIDIMENSIONAL_ROWS = [
+    {"Time": "1997", "Store": "USA", "Unit Sales": 266773.0, "Store Cost": 225627.2336},
+    {"Time": "1997", "Store": "Canada", "Unit Sales": 10, "Store Cost": 11.5},
+    {"Time": "1998", "Store": "USA", "Unit Sales": 5.0, "Store Cost": 6.0}
+]
+
+SPARSE_ROWS = [
+    {"Time": "1997", "Store": "USA", "Unit Sales": 266773.0, "Store Cost": None},
+    {"Time": "1997", "Store": "Canada", "Unit Sales": None, "Store Cost": None},
+    {"Time": "1998", "Store": "USA", "Unit Sales": 5.0, "Store Cost": 6.0}
+]
+
+TRAILING_EMPTY_ROWS = [
+    {"Time": "1997", "Store": "USA", "Unit Sales": 266773.0, "Store Cost": 225627.2336},
+    {"Time": "1997", "Store": "Canada", "Unit Sales": None, "Store Cost": None},
+    {"Time": "1998", "Store": "USA", "Unit Sales": None, "Store Cost": None}
+]
+
+FAULT = (
+    b'<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/"><soap:Body><soap:Fault>'
+    b'<faultcode>XMLAnalysisError</faultcode><faultstring>Query failed</faultstring>'
+    b'<detail><Error Description="Size of CrossJoin result exceeded limit"/></detail>'
+    b'</soap:Fault></soap:Body></soap:Envelope>'
+)
+
+
+def read_fixture(file_name):
+    with open(os.path.join(FIXTURES_DIRECTORY, file_name), "rb") as fixture:
+        return fixture.read()
+
+
+class ChunkedStream(object):
+    """
+    Returns at most chunk_size bytes per read, as a slow network would.
+    """
+    def __init__(self, content, chunk_size):
+        self.stream = io.BytesIO(content)
+        self.chunk_size = chunk_size
+
+    def read(self, size=-1):
+        return self.stream.read(self.chunk_size if size < 0 else min(size, self.chunk_size))
+
+
+class MockResponse(object):
+    def __init__(self, content, chunk_size=1024 * 1024):
+        self.raw = ChunkedStream(content, chunk_size)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def read_batches(content, chunk_size):
+    response = MockResponse(content)
+    batches = list(StreamedCube(response).iter_batches(ChunkedStream(content, chunk_size)))
+    assert response.closed
+    return batches
+
+
+def get_chunk_sizes(content):
+    # from one cell split over several chunks to the whole response in one chunk
+    return [1, 7, 64, 100, 333, 1000, len(content)]
+
+
+@pytest.mark.parametrize("file_name,expected_rows", [
+    ("multidimensional.xml", MULTIDIMENSIONAL_ROWS),
+    ("sparse.xml", SPARSE_ROWS),
+    ("trailing_empty_rows.xml", TRAILING_EMPTY_ROWS)
+])
+def test_iter_batches_is_independent_of_chunk_boundaries(file_name, expected_rows):
+    content = read_fixture(file_name)
+    for chunk_size in get_chunk_sizes(content):
+        batches = read_batches(content, chunk_size)
+        rows = [row for batch in batches for row in batch.iter_dicts()]
+        assert rows == expected_rows, "chunk_size={}".format(chunk_size)
+
+
+@pytest.mark.parametrize("file_name", ["multidimensional.xml", "sparse.xml", "trailing_empty_rows.xml"])
+def test_iter_batches_emits_each_row_once(file_name):
+    content = read_fixture(file_name)
+    for chunk_size in get_chunk_sizes(content):
+        next_start = 0
+        for batch in read_batches(content, chunk_size):
+            assert batch.start == next_start
+            assert batch.length > 0
+            next_start += batch.length
+        assert next_start == 3
+
+
+def test_iter_batches_holds_back_the_row_of_the_last_cell():
+    content = read_fixture("multidimensional.xml")
+    # the first chunk ends right after cell 0, the other cell of row 0 comes in the next one
+    split = content.index(b"</Cell>") + len(b"</Cell>")
+    chunks = [content[:split]] + [content[index:index + 64] for index in range(split, len(content), 64)]
+
+    class ListStream(object):
+        def read(self, size=-1):
+            return chunks.pop(0) if chunks else b""
+
+    batches = StreamedCube(MockResponse(content)).iter_batches(ListStream())
+    first_batch = next(batches)
+    assert first_batch.start == 0
+    assert list(first_batch.iter_dicts())[0] == MULTIDIMENSIONAL_ROWS[0]
+    rows = list(first_batch.iter_dicts()) + [row for batch in batches for row in batch.iter_dicts()]
+    assert rows == MULTIDIMENSIONAL_ROWS
+
+
+def test_iter_batches_places_cells_without_ordinal_in_document_order():
+    content = read_fixture("multidimensional.xml")
+    for ordinal in range(6):
+        content = content.replace(' CellOrdinal="{}"'.format(ordinal).encode("utf-8"), b"")
+    for chunk_size in get_chunk_sizes(content):
+        rows = [row for batch in read_batches(content, chunk_size) for row in batch.iter_dicts()]
+        assert rows == MULTIDIMENSIONAL_ROWS
+
+
+def test_iter_batches_raises_soap_faults():
+    with pytest.raises(Exception, match="Size of CrossJoin result exceeded limit"):
+        read_batches(FAULT, 16)
+
+
+def test_read_header():
+    response = MockResponse(read_fixture("multidimensional.xml"), chunk_size=100)
+    left_columns_names, columns = StreamedCube(response, properties=["[Store].[Store Type]"]).read_header()
+    assert left_columns_names == ["Time", "Store", "[Store].[Store Type]"]
+    assert columns == [("Unit Sales", "[Measures].[Unit Sales]"), ("Store Cost", "[Measures].[Store Cost]")]
+    assert response.closed
+
+
+def test_iter_tuples_and_first_tuple_and_cell():
+    content = read_fixture("sparse.xml")
+    unique_names = [
+        [member.get("UName") for member in members]
+        for members in StreamedCube(MockResponse(content, chunk_size=50)).iter_tuples(1)
+    ]
+    assert unique_names == [
+        ["[Time].[1997]", "[Store].[USA]"],
+        ["[Time].[1997]", "[Store].[Canada]"],
+        ["[Time].[1998]", "[Store].[USA]"]
+    ]
+    first_tuple = StreamedCube(MockResponse(content)).read_first_tuple(0)
+    assert [member.get("UName") for member in first_tuple] == ["[Measures].[Unit Sales]"]
+    assert StreamedCube(MockResponse(content)).read_first_cell() == "266773"
+
+
+def test_rowset():
+    content = read_fixture("tabular.xml")
+    for chunk_size in get_chunk_sizes(content):
+        rows = [
+            row for batch in StreamedRowset(MockResponse(content)).iter_batches(ChunkedStream(content, chunk_size))
+            for row in batch.iter_dicts()
+        ]
+        assert rows == [
+            {"[Time].[Year].[MEMBER_CAPTION]": "1997", "[Measures].[Unit Sales]": 266773.0},
+            {"[Time].[Year].[MEMBER_CAPTION]": "1998", "[Measures].[Unit Sales]": None}
+        ]
+    assert StreamedRowset(MockResponse(content, chunk_size=100)).read_header() == [
+        ("[Time].[Year].[MEMBER_CAPTION]", "string"),
+        ("[Measures].[Unit Sales]", "double")
+    ]